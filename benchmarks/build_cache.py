@@ -0,0 +1,86 @@
+"""
+Build cache benchmark: a parent of row_count cached rows, each one a chain of item_count synthetic
+leafcells, built with a cold cache (misses) and then with a warm one (hits).
+Rows have lowercase pin and net names, which the SPICE reader of a restored CDL uppercases,
+so both builds must write the same CDL and the same layout.
+
+Run: python -m benchmarks.build_cache [row_count] [item_count]
+"""
+import sys
+import time
+import logging
+import tempfile
+from pathlib import Path
+from typing import Dict
+
+from ic_stitcher.configurations import GlobalConfigs as globconf
+from ic_stitcher.configurations import GlobalLayoutConfigs as layconf
+from ic_stitcher.configurations import GlobalSchematicConfigs as schconf
+from ic_stitcher.configurations import kdb
+from ic_stitcher.custom import BUILD_CACHE, CustomCell, Item, LeafCell, Pin
+
+from .synthetic import PIN_LAY, write_leafcell
+
+class _Row(CustomCell):
+    def __init__(self, cell_name:str, item_count:int):
+        super().__init__(cell_name)
+        leaf = LeafCell("LINK")
+        last = item_count - 1
+        for ind in range(item_count):
+            self[f"l{ind}"] = Item(leaf, {"P0": Pin("in") if ind == 0 else f"n{ind}",
+                                          "P1": Pin("out") if ind == last else f"n{ind + 1}"})
+
+class _Rows(CustomCell):
+    def __init__(self, cell_name:str, row_count:int, item_count:int):
+        super().__init__(cell_name)
+        for ind in range(row_count):
+            self[f"r{ind}"] = Item(_Row.cached(f"row{ind}", item_count),
+                                   {"in": f"m{ind}", "out": f"m{ind + 1}"}, trans=kdb.Trans(0, ind * 1000))
+
+def _build(directory:Path, row_count:int, item_count:int) -> float:
+    start = time.perf_counter()
+    cell = _Rows("rows", row_count, item_count)
+    cell.claim(str(directory))
+    return time.perf_counter() - start
+
+def _same_layout(first:Path, second:Path) -> bool:
+    layouts = []
+    for path in (first, second):
+        layout = kdb.Layout()
+        layout.read(str(path))
+        layouts.append(layout)
+    return kdb.LayoutDiff().compare(layouts[0], layouts[1], kdb.LayoutDiff.Silent)
+
+def run(row_count:int, item_count:int) -> Dict[str, float]:
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        write_leafcell(tmp/"leafcells", "LINK", 2)
+        layconf.PIN_LAY = PIN_LAY
+        layconf.LEAFCELL_PATH = [tmp/"leafcells"]
+        schconf.LEAFCELL_PATH = [tmp/"leafcells"]
+        cache_dir = globconf.BUILD_CACHE_DIR
+        globconf.BUILD_CACHE_DIR = tmp/"cache"
+        try:
+            res:Dict[str, float] = {"rows": row_count, "items": item_count}
+            res["miss"] = _build(tmp/"miss", row_count, item_count)
+            hits = BUILD_CACHE.hits
+            res["hit"] = _build(tmp/"hit", row_count, item_count)
+            if BUILD_CACHE.hits - hits != row_count:
+                raise RuntimeError(f"Expected {row_count} cache hits, got {BUILD_CACHE.hits - hits}")
+        finally:
+            globconf.BUILD_CACHE_DIR = cache_dir
+        if (tmp/"miss"/"rows.cdl").read_text() != (tmp/"hit"/"rows.cdl").read_text():
+            raise RuntimeError("A restored cell changes the CDL of its parent")
+        if not _same_layout(tmp/"miss"/"rows.gds", tmp/"hit"/"rows.gds"):
+            raise RuntimeError("A restored cell changes the layout of its parent")
+        return res
+
+def main(row_count:int = 10, item_count:int = 200):
+    logging.disable(logging.WARNING) # Repeated subcell warnings are not measured
+    res = run(row_count, item_count)
+    print(f"{row_count} rows of {item_count} items, same CDL and layout")
+    for mode in ("miss", "hit"):
+        print(f"{mode:>6}: {res[mode]:.3f}s")
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,55 @@
+"""
+Bus connection benchmark: items of a leafcell with a wide bus pin "D", connected by a bus slice
+(Item(cell, {"D": bus[0:bits]})) and bit by bit (bus.connection("D")).
+
+Run: python -m benchmarks.buses [bits] [item_count]
+"""
+import sys
+import time
+import logging
+import tempfile
+from pathlib import Path
+from typing import Dict
+
+from ic_stitcher.configurations import GlobalLayoutConfigs as layconf
+from ic_stitcher.configurations import GlobalSchematicConfigs as schconf
+from ic_stitcher.custom import CustomCell, Item, LeafCell, NetBus
+
+from .synthetic import PIN_LAY, write_leafcell
+
+class _Word(CustomCell):
+    def __init__(self, bits:int, item_count:int, by_bits:bool):
+        super().__init__("WORDS")
+        data = NetBus("data", bits)
+        leaf = LeafCell("WORD")
+        self.item_time = 0.0 # Item construction, the rest is spent in __setitem__
+        for ind in range(item_count):
+            start = time.perf_counter()
+            item = Item(leaf, data.connection("D") if by_bits else {"D": data[0:bits]})
+            self.item_time += time.perf_counter() - start
+            self[f"W{ind}"] = item
+
+def run(bits:int, item_count:int) -> Dict[str, float]:
+    with tempfile.TemporaryDirectory() as tmp:
+        write_leafcell(Path(tmp), "WORD", bits, pin_name="D[{}]")
+        layconf.PIN_LAY = PIN_LAY
+        layconf.LEAFCELL_PATH = [Path(tmp)]
+        schconf.LEAFCELL_PATH = [Path(tmp)]
+        LeafCell("WORD")
+        res:Dict[str, float] = {"bits": bits, "items": item_count}
+        for mode, by_bits in (("slice", False), ("bit by bit", True)):
+            start = time.perf_counter()
+            cell = _Word(bits, item_count, by_bits)
+            res[mode] = time.perf_counter() - start
+            res[f"{mode} items"] = cell.item_time
+        return res
+
+def main(bits:int = 1024, item_count:int = 64):
+    logging.disable(logging.INFO) # Item logs are not measured
+    res = run(bits, item_count)
+    print(f"{item_count} items with a {bits}-bit bus")
+    for mode in ("slice", "bit by bit"):
+        print(f"{mode:>10}: {res[mode]:.3f}s (Item() {res[f'{mode} items']:.3f}s)")
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
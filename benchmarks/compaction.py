@@ -0,0 +1,44 @@
+"""
+Pre-save compaction benchmark: a tree with copies of the same leafcell under uniquified names
+(as left by copying subtrees into parents) and orphan cells, compacted by compactor.compact().
+
+Run: python -m benchmarks.compaction [copy_count] [pin_count]
+"""
+import sys
+import time
+from typing import Dict
+
+from ic_stitcher.configurations import kdb
+from ic_stitcher.layout.compactor import compact
+
+from .synthetic import pin_cell
+
+def run(copy_count:int, pin_count:int) -> Dict[str, float]:
+    layout = kdb.Layout(True)
+    top = layout.create_cell("TOP")
+    for ind in range(copy_count):
+        block = layout.create_cell(f"BLOCK{ind}")
+        leaf = pin_cell(layout, "LEAF", pin_count) # Uniquified to LEAF$1, LEAF$2, ...
+        block.insert(kdb.CellInstArray(leaf.cell_index(), kdb.Trans()))
+        top.insert(kdb.CellInstArray(block.cell_index(), kdb.Trans(0, ind * pin_count * 100)))
+    for ind in range(copy_count // 4):
+        pin_cell(layout, f"ORPHAN{ind}", pin_count)
+    start = time.perf_counter()
+    report = compact(layout, top, measure=True)
+    elapsed = time.perf_counter() - start
+    kept = [name for name in report.merged if not name.startswith("LEAF")]
+    if kept:
+        raise RuntimeError(f"Cells of different names are merged: {kept[:3]}")
+    return {"cells_saved": report.cells_saved, "pruned": len(report.pruned),
+            "merged": len(report.merged), "bytes_before": report.bytes_before,
+            "bytes_after": report.bytes_after, "compact_s": elapsed}
+
+def main(copy_count:int = 100, pin_count:int = 200):
+    res = run(copy_count, pin_count)
+    print(f"{copy_count} copies of a cell with {pin_count} pins")
+    print(f"cells removed: {res['cells_saved']} ({res['pruned']} orphan, {res['merged']} duplicate)")
+    print(f"bytes: {res['bytes_before']} -> {res['bytes_after']}, compaction {res['compact_s']:.3f}s "
+          f"(including two measuring writes)")
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,58 @@
+"""
+Layout output formats benchmark: file size, write time (KDBCell.save) and read time
+of GDS2, gzip compressed GDS2 and OASIS (CBLOCK, strict mode) on a synthetic layout.
+
+Run: python -m benchmarks.io_formats [instance_count] [pin_count]
+"""
+import os
+import sys
+import time
+import tempfile
+from pathlib import Path
+from typing import Dict, List
+
+from ic_stitcher.configurations import GlobalLayoutConfigs as config
+from ic_stitcher.configurations import kdb
+from ic_stitcher.layout.floorplaner import KDBCell, LAYOUT_FORMATS
+
+from .synthetic import pin_cell
+
+def _layout(instance_count:int, pin_count:int) -> kdb.Layout:
+    " Top cell with single instances of a few pin cells, placed on a grid "
+    layout = kdb.Layout()
+    leafs = [pin_cell(layout, f"LEAF{ind}", pin_count + ind) for ind in range(4)]
+    top = layout.create_cell("TOP")
+    step = leafs[-1].bbox().width() + 1000
+    columns = max(int(instance_count ** 0.5), 1)
+    for ind in range(instance_count):
+        leaf = leafs[ind % len(leafs)]
+        trans = kdb.Trans(ind % 4, False, (ind % columns) * step, (ind // columns) * step)
+        top.insert(kdb.CellInstArray(leaf.cell_index(), trans))
+    return layout
+
+def run(instance_count:int, pin_count:int) -> List[Dict[str, float]]:
+    layout = _layout(instance_count, pin_count)
+    top = layout.top_cell()
+    config.WRITE_TIMESTAMPS = False
+    res = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for output_format, suffix in LAYOUT_FORMATS.items():
+            path = Path(tmp)/f"top{suffix}"
+            start = time.perf_counter()
+            KDBCell(top).save(path)
+            write = time.perf_counter() - start
+            start = time.perf_counter()
+            kdb.Layout().read(str(path))
+            read = time.perf_counter() - start
+            res.append({"format": output_format, "bytes": os.stat(path).st_size,
+                        "write_s": write, "read_s": read})
+    return res
+
+def main(instance_count:int = 2000, pin_count:int = 500):
+    print(f"{instance_count} instances of 4 cells with ~{pin_count} pins")
+    print(f"{'format':>8} {'size, kB':>10} {'write, s':>9} {'read, s':>8}")
+    for res in run(instance_count, pin_count):
+        print(f"{res['format']:>8} {res['bytes']/1024:>10.1f} {res['write_s']:>9.3f} {res['read_s']:>8.3f}")
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
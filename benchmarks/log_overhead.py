@@ -0,0 +1,68 @@
+"""
+Logging overhead of CustomCell.__setitem__: a chain of item_count items built with the default
+log level, in the quiet mode and with logging disabled. Messages are written to os.devnull,
+so the terminal isn't measured.
+
+Run: python -m benchmarks.log_overhead [item_count]
+"""
+import os
+import sys
+import time
+import logging
+import tempfile
+from pathlib import Path
+from typing import Dict
+
+from ic_stitcher.configurations import GlobalLayoutConfigs as layconf
+from ic_stitcher.configurations import GlobalSchematicConfigs as schconf
+from ic_stitcher.custom import CustomCell, Item, LeafCell
+from ic_stitcher.utils.Logging import package_logger, quiet
+
+from .synthetic import PIN_LAY, write_leafcell
+
+class _Chain(CustomCell):
+    def __init__(self, item_count:int):
+        super().__init__("CHAIN")
+        leaf = LeafCell("LINK")
+        for ind in range(item_count):
+            self[f"L{ind}"] = Item(leaf, {"P0": f"n{ind}", "P1": f"n{ind + 1}"})
+
+def _build(item_count:int) -> float:
+    start = time.perf_counter()
+    _Chain(item_count)
+    return time.perf_counter() - start
+
+def run(item_count:int) -> Dict[str, float]:
+    with tempfile.TemporaryDirectory() as tmp, open(os.devnull, "w") as devnull:
+        write_leafcell(Path(tmp), "LINK", 2)
+        layconf.PIN_LAY = PIN_LAY
+        layconf.LEAFCELL_PATH = [Path(tmp)]
+        schconf.LEAFCELL_PATH = [Path(tmp)]
+        LeafCell("LINK")
+        logger = package_logger()
+        level = logger.level
+        streams = [handler.stream for handler in logger.handlers]
+        for handler in logger.handlers:
+            handler.stream = devnull # setStream() is Python 3.7+
+        res:Dict[str, float] = {"items": item_count}
+        try:
+            res["default"] = _build(item_count)
+            quiet()
+            res["quiet"] = _build(item_count)
+            logging.disable(logging.CRITICAL)
+            res["disabled"] = _build(item_count)
+        finally:
+            logging.disable(logging.NOTSET)
+            logger.setLevel(level)
+            for handler, stream in zip(logger.handlers, streams):
+                handler.stream = stream
+        return res
+
+def main(item_count:int = 10000):
+    res = run(item_count)
+    print(f"{item_count} items")
+    for mode in ("default", "quiet", "disabled"):
+        print(f"{mode:>10}: {res[mode]:.3f}s")
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,60 @@
+"""
+Memory benchmark of connection objects: a chain of items of a 4-pin leafcell, neighbours share
+nets by name ("n1" connects items 0 and 1) and all items share "vdd" and "vss",
+measured by tracemalloc after the build. The placement is deferred, the supply nets
+would pull every item onto the first one.
+
+Run: python -m benchmarks.memory [item_count]
+"""
+import gc
+import sys
+import logging
+import tempfile
+import tracemalloc
+from pathlib import Path
+from typing import Dict
+
+from ic_stitcher.configurations import GlobalLayoutConfigs as layconf
+from ic_stitcher.configurations import GlobalSchematicConfigs as schconf
+from ic_stitcher.custom import CustomCell, Item, LeafCell
+
+from .synthetic import PIN_LAY, write_leafcell
+
+class _Chain(CustomCell):
+    def __init__(self, item_count:int):
+        super().__init__("CHAIN")
+        leaf = LeafCell("LINK")
+        for ind in range(item_count):
+            self[f"L{ind}"] = Item(leaf, {"P0": f"n{ind}", "P1": f"n{ind + 1}",
+                                          "P2": "vdd", "P3": "vss"})
+
+def run(item_count:int) -> Dict[str, float]:
+    with tempfile.TemporaryDirectory() as tmp:
+        write_leafcell(Path(tmp), "LINK", 4)
+        layconf.PIN_LAY = PIN_LAY
+        layconf.LEAFCELL_PATH = [Path(tmp)]
+        schconf.LEAFCELL_PATH = [Path(tmp)]
+        LeafCell("LINK")
+        deferred = layconf.DEFERRED_PLACEMENT
+        layconf.DEFERRED_PLACEMENT = True # Constraints are recorded, nothing is moved
+        try:
+            gc.collect()
+            tracemalloc.start()
+            cell = _Chain(item_count)
+            gc.collect()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        finally:
+            layconf.DEFERRED_PLACEMENT = deferred
+        nets = {id(net) for item in cell.items.values() for net in item.connections.values()}
+        return {"items": item_count, "bytes": current, "peak_bytes": peak,
+                "bytes_per_item": current / item_count, "net_objects": len(nets)}
+
+def main(item_count:int = 20000):
+    logging.disable(logging.INFO) # Item logs are not measured
+    res = run(item_count)
+    print(f"{item_count} items: {res['bytes'] / 2**20:.1f} MiB retained ({res['bytes_per_item']:.0f} B/item), "
+          f"peak {res['peak_bytes'] / 2**20:.1f} MiB, {res['net_objects']} Net objects")
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,82 @@
+"""
+PCell cache benchmark: variants of two synthetic PCells are produced in fresh layouts for a number
+of rounds, with the cache of built cells and without it.
+Each distinct parameter set must be built once and stored as its own cache entry,
+the produced variants must differ in size.
+
+Run: python -m benchmarks.pcell_cache [variant_count] [round_count]
+"""
+import sys
+import time
+import logging
+import tempfile
+from pathlib import Path
+from typing import Dict
+
+from ic_stitcher.configurations import GlobalLayoutConfigs as layconf
+from ic_stitcher.configurations import GlobalSchematicConfigs as schconf
+from ic_stitcher.configurations import kdb
+from ic_stitcher.custom import CustomCell, Item, LeafCell
+from ic_stitcher.klayout_pcell.pcell_gen import pcell_factory
+
+from .synthetic import PIN_LAY, write_leafcell
+
+class _Chain(CustomCell):
+    def __init__(self, cell_name:str = "CHAIN", count:int = 1):
+        super().__init__(cell_name)
+        leaf = LeafCell("LINK")
+        for ind in range(count):
+            self[f"L{ind}"] = Item(leaf, {"P0": f"n{ind}", "P1": f"n{ind + 1}"})
+
+class _Column(CustomCell):
+    # Parameters of both PCells have the same names in different positions
+    def __init__(self, cell_name:str = "COLUMN", pitch:int = 1000, count:int = 1):
+        super().__init__(cell_name)
+        leaf = LeafCell("LINK")
+        for ind in range(count):
+            self[f"L{ind}"] = Item(leaf, {}, trans=kdb.Trans(0, ind * pitch))
+
+def _produce(library:kdb.Library, variant_count:int, round_count:int) -> float:
+    start = time.perf_counter()
+    for _ in range(round_count):
+        layout = kdb.Layout() # Variants are built again for each layout
+        for count in range(1, variant_count + 1):
+            chain = layout.create_cell("CHAIN", library.name(), {"count": count})
+            column = layout.create_cell("COLUMN", library.name(), {"count": count, "cell_name": f"COL{count}"})
+            if count > 1 and (chain.bbox() == chain_box or column.bbox() == column_box):
+                raise RuntimeError(f"Variant count={count} is the same cell as count={count - 1}")
+            chain_box, column_box = chain.bbox(), column.bbox()
+    return time.perf_counter() - start
+
+def run(variant_count:int, round_count:int) -> Dict[str, float]:
+    with tempfile.TemporaryDirectory() as tmp:
+        write_leafcell(Path(tmp), "LINK", 2)
+        layconf.PIN_LAY = PIN_LAY
+        layconf.LEAFCELL_PATH = [Path(tmp)]
+        schconf.LEAFCELL_PATH = [Path(tmp)]
+        factories = [pcell_factory(_Chain), pcell_factory(_Column)]
+        library = kdb.Library()
+        for name, factory in zip(("CHAIN", "COLUMN"), factories):
+            library.layout().register_pcell(name, factory)
+        library.register("PCELL_CACHE_BENCHMARK")
+        res:Dict[str, float] = {"variants": variant_count, "rounds": round_count}
+        res["cached"] = _produce(library, variant_count, round_count)
+        for factory in factories:
+            info = factory.cache_info()
+            if info["misses"] != variant_count or info["size"] != min(variant_count, factory.cache_size):
+                raise RuntimeError(f"{variant_count} parameter sets of {factory.func_name}, cache: {info}")
+            factory.cache_clear()
+            factory.cache_size = 0
+        res["uncached"] = _produce(library, variant_count, round_count)
+        library.delete()
+        return res
+
+def main(variant_count:int = 8, round_count:int = 20):
+    logging.disable(logging.WARNING)
+    res = run(variant_count, round_count)
+    print(f"{variant_count} variants of 2 PCells, {round_count} layouts, one cache entry per variant")
+    for mode in ("cached", "uncached"):
+        print(f"{mode:>9}: {res[mode]:.3f}s")
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
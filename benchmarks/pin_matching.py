@@ -0,0 +1,60 @@
+"""
+Pin extraction benchmark: label-to-box matching of KDBCell._get_pins on synthetic cells,
+compared to a search with a RecursiveShapeIterator per pin box.
+Each cell has a long power strap, which is far bigger than the typical pin.
+
+Run: python -m benchmarks.pin_matching [pin_count ...]
+"""
+import sys
+import time
+from typing import Dict
+
+from ic_stitcher.configurations import GlobalLayoutConfigs as config
+from ic_stitcher.configurations import kdb
+from ic_stitcher.layout.floorplaner import KDBCell, LayPin
+
+from .synthetic import PIN_LAY, PIN_PITCH, pin_cell
+
+DEFAULT_COUNTS = [100, 1000, 10000]
+
+class _PerBoxCell(KDBCell):
+    " Reference: one recursive label search per pin box "
+    def _get_pins(self) -> Dict[str, LayPin]:
+        pins = {}
+        for box_info, lbl_info in config.PIN_LAY:
+            box_layer = self.kdb_layout.find_layer(box_info)
+            lbl_layer = self.kdb_layout.find_layer(lbl_info)
+            for box_shape in self.kdb_cell.each_shape(box_layer, kdb.Shapes.SBoxes):
+                reciter = kdb.RecursiveShapeIterator(self.kdb_layout, self.kdb_cell, lbl_layer, box_shape.box)
+                labels = [item.shape() for item in reciter.each()]
+                if len(labels) == 1:
+                    pin = LayPin(box_shape.box, box_info, labels[0].text, lbl_info)
+                    pins[pin.name] = pin
+        return pins
+
+def run(pin_count:int) -> Dict[str, float]:
+    config.PIN_LAY = PIN_LAY
+    layout = kdb.Layout()
+    cell = pin_cell(layout, f"PINS{pin_count}", pin_count)
+    box_layer, lbl_layer = (layout.layer(info) for info in PIN_LAY[0])
+    cell.shapes(box_layer).insert(kdb.Box(0, -2 * PIN_PITCH, 10**8, -PIN_PITCH)) # Power strap
+    cell.shapes(lbl_layer).insert(kdb.Text("VDD", kdb.Trans(10**7, -PIN_PITCH)))
+    start = time.perf_counter()
+    reference = _PerBoxCell(cell).pins
+    per_box = time.perf_counter() - start
+    start = time.perf_counter()
+    pins = KDBCell(cell).pins
+    batched = time.perf_counter() - start
+    if "VDD" not in pins or {n: p.box for n, p in pins.items()} != {n: p.box for n, p in reference.items()}:
+        raise RuntimeError(f"Pins are mismatched for {pin_count} pins")
+    return {"pins": pin_count, "per_box_s": per_box, "batched_s": batched}
+
+def main(counts = DEFAULT_COUNTS):
+    print(f"{'pins':>8} {'per box, s':>12} {'batched, s':>12} {'speedup':>8}")
+    for count in counts:
+        res = run(count)
+        print(f"{res['pins']:>8} {res['per_box_s']:>12.4f} {res['batched_s']:>12.4f} "
+              f"{res['per_box_s']/res['batched_s']:>8.1f}")
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_COUNTS)
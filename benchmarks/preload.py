@@ -0,0 +1,45 @@
+"""
+Leafcell preloading benchmark: preload() of synthetic leafcells serially, with threads and with processes.
+
+Run: python -m benchmarks.preload [cell_count] [pin_count] [workers]
+"""
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict
+
+from ic_stitcher.configurations import GlobalLayoutConfigs as layconf
+from ic_stitcher.configurations import GlobalSchematicConfigs as schconf
+from ic_stitcher.custom import LeafCell, preload
+
+from .synthetic import PIN_LAY, write_leafcell
+
+def _modes(workers:int):
+    return [("serial", 1, False),
+            (f"{workers} threads", workers, False),
+            (f"{workers} processes", workers, True)]
+
+def run(cell_count:int, pin_count:int, workers:int) -> Dict[str, float]:
+    with tempfile.TemporaryDirectory() as tmp:
+        for ind in range(cell_count):
+            write_leafcell(Path(tmp), f"LEAF{ind}", pin_count)
+        layconf.PIN_LAY = PIN_LAY
+        layconf.LEAFCELL_PATH = [Path(tmp)]
+        schconf.LEAFCELL_PATH = [Path(tmp)]
+        res:Dict[str, float] = {"cells": cell_count, "pins": pin_count}
+        for mode, threads, processes in _modes(workers):
+            LeafCell._loaded.clear()
+            report = preload("all", workers=threads, processes=processes)
+            if not report.ok:
+                raise RuntimeError(f"Preload failed:\n{report}")
+            res[mode] = report.wall_time
+        return res
+
+def main(cell_count:int = 50, pin_count:int = 2000, workers:int = 8):
+    res = run(cell_count, pin_count, workers)
+    print(f"{cell_count} leafcells, {pin_count} pins each")
+    for mode, _, _ in _modes(workers):
+        print(f"{mode:>14}: {res[mode]:.3f}s")
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
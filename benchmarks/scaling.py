@@ -0,0 +1,140 @@
+"""
+Scaling benchmark of the build hot paths on synthetic leafcells: LeafCell load, Item construction,
+CustomCell.__setitem__, deferred placement and claim(), for a chain of item_count items.
+Neighbours share nets by name ("n1" connects P1 of item 0 with P0 of item 1), so the placement
+abuts the items in a row. Results are written as JSON, to be compared between commits.
+
+Run: python -m benchmarks.scaling [--counts 1000 10000 100000] [--pins 4] [--layers 2] [--depth 2]
+                                  [--output scaling.json] [--compare baseline.json] [--stats]
+"""
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import tempfile
+import subprocess
+from pathlib import Path
+from typing import Any, Dict, List, Union
+
+from ic_stitcher.configurations import GlobalConfigs as globconf
+from ic_stitcher.configurations import GlobalLayoutConfigs as layconf
+from ic_stitcher.configurations import GlobalSchematicConfigs as schconf
+from ic_stitcher.configurations import kdb
+from ic_stitcher.custom import CustomCell, Item, LeafCell, Pin
+
+from .synthetic import SKY130_PIN_LAY, write_leafcell
+
+DEFAULT_COUNTS = [1000, 10000, 100000]
+PHASES = ["leaf_load", "item", "setitem", "place", "claim"]
+
+class _Chain(CustomCell):
+    def __init__(self, leaf:LeafCell, item_count:int):
+        super().__init__("CHAIN")
+        self.item_time = 0.0 # Item construction, the rest of the build is spent in __setitem__
+        last = item_count - 1
+        for ind in range(item_count):
+            start = time.perf_counter()
+            item = Item(leaf, {"P0": Pin("IN") if ind == 0 else f"n{ind}",
+                               "P1": Pin("OUT") if ind == last else f"n{ind + 1}"})
+            self.item_time += time.perf_counter() - start
+            self[f"L{ind}"] = item
+
+def _revision() -> Union[str,None]:
+    " Commit of the working tree, to label the results "
+    try:
+        res = subprocess.run(["git", "rev-parse", "--short", "HEAD"], stdout=subprocess.PIPE,
+                             stderr=subprocess.PIPE, universal_newlines=True,
+                             cwd=str(Path(__file__).parent), check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return res.stdout.strip() or None
+
+def run(item_count:int, pin_count:int = 4, layer_count:int = 2, depth:int = 2) -> Dict[str, Any]:
+    """ Time each phase of one build, seconds """
+    pin_lay = SKY130_PIN_LAY
+    with tempfile.TemporaryDirectory() as tmp:
+        write_leafcell(Path(tmp), "LINK", max(pin_count, 2), pin_lay,
+                       layer_count=layer_count, depth=depth)
+        layconf.PIN_LAY = pin_lay
+        layconf.LEAFCELL_PATH = [Path(tmp)]
+        schconf.LEAFCELL_PATH = [Path(tmp)]
+        deferred = layconf.DEFERRED_PLACEMENT
+        layconf.DEFERRED_PLACEMENT = True # Placement is timed on its own
+        try:
+            LeafCell._loaded.pop("LINK", None)
+            res:Dict[str, Any] = {"items": item_count, "pins": pin_count,
+                                  "layers": layer_count, "depth": depth}
+            start = time.perf_counter()
+            leaf = LeafCell("LINK")
+            res["leaf_load"] = time.perf_counter() - start
+            start = time.perf_counter()
+            cell = _Chain(leaf, item_count)
+            build = time.perf_counter() - start
+            res["item"] = cell.item_time
+            res["setitem"] = build - cell.item_time
+            start = time.perf_counter()
+            with cell.stats.collect():
+                conflicts = cell.layout.place()
+            res["place"] = time.perf_counter() - start
+            if conflicts:
+                raise RuntimeError(f"Unexpected placement conflicts: {conflicts[:3]}")
+            start = time.perf_counter()
+            cell.claim(tmp)
+            res["claim"] = time.perf_counter() - start
+            res["total"] = sum(res[phase] for phase in PHASES)
+            if globconf.COLLECT_STATS:
+                res["stats"] = cell.total_stats().to_dict()
+        finally:
+            layconf.DEFERRED_PLACEMENT = deferred
+        return res
+
+def report(results:List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {"revision": _revision(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "klayout": kdb.__version__ if hasattr(kdb, "__version__") else None,
+            "machine": platform.machine(),
+            "results": results}
+
+def compare(results:List[Dict[str, Any]], baseline:Dict[str, Any]):
+    " Print the time ratio of each phase to the baseline run of the same size "
+    def key(res):
+        return (res["items"], res["pins"], res["layers"], res["depth"])
+    old = {key(res): res for res in baseline["results"]}
+    print(f"Compared to {baseline.get('revision') or baseline.get('time')}, new/old time:")
+    print(f"{'items':>8} " + " ".join(f"{phase:>10}" for phase in PHASES + ["total"]))
+    for res in results:
+        base = old.get(key(res))
+        if base is None:
+            continue
+        ratios = [res[phase] / base[phase] if base[phase] else float("nan") for phase in PHASES + ["total"]]
+        print(f"{res['items']:>8} " + " ".join(f"{ratio:>10.2f}" for ratio in ratios))
+
+def main(argv:Union[List[str],None] = None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.scaling", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--counts", type=int, nargs="+", default=DEFAULT_COUNTS, help="item counts")
+    parser.add_argument("--pins", type=int, default=4, help="pins of the leafcell")
+    parser.add_argument("--layers", type=int, default=2, help="geometry layers of the leafcell")
+    parser.add_argument("--depth", type=int, default=2, help="hierarchy depth of the leafcell")
+    parser.add_argument("--output", type=Path, help="JSON file of the results")
+    parser.add_argument("--compare", type=Path, help="JSON file of a previous run")
+    parser.add_argument("--stats", action="store_true", help="collect the build stats into the results")
+    args = parser.parse_args(argv)
+    globconf.COLLECT_STATS = args.stats
+    logging.disable(logging.WARNING) # Item logs and repeated subcell warnings are not measured
+    results = []
+    print(f"{'items':>8} " + " ".join(f"{phase + ', s':>10}" for phase in PHASES + ["total"]))
+    for count in args.counts:
+        res = run(count, args.pins, args.layers, args.depth)
+        results.append(res)
+        print(f"{count:>8} " + " ".join(f"{res[phase]:>10.4f}" for phase in PHASES + ["total"]))
+    data = report(results)
+    if args.output:
+        args.output.write_text(json.dumps(data, indent=1))
+    if args.compare:
+        compare(results, json.loads(args.compare.read_text()))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
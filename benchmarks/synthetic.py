@@ -0,0 +1,79 @@
+"""
+Synthetic leafcells for benchmarks, pins follow the PIN_LAY conventions of examples/sky130:
+a pin is a box on the pin layer with a label inside on the label layer.
+"""
+from pathlib import Path
+from typing import List, Tuple
+
+from ic_stitcher.configurations import Layer, kdb
+
+# Pin box and label layers of examples/sky130
+SKY130_PIN_LAY:List[Tuple[Layer,Layer]] = [
+    (Layer(30, 0), Layer(30, 10)), # Poly2
+    (Layer(34, 0), Layer(34, 10)), # Metal1
+    (Layer(36, 0), Layer(36, 10)), # Metal2
+    (Layer(42, 0), Layer(42, 10)), # Metal3
+]
+PIN_LAY:List[Tuple[Layer,Layer]] = SKY130_PIN_LAY[1:3] # Metal1, Metal2
+
+PIN_SIZE = 100 # Side of the pin box, DBU
+PIN_PITCH = 400 # Distance between pins, DBU
+
+def pin_cell(layout:kdb.Layout, name:str, pin_count:int,
+             pin_lay:List[Tuple[Layer,Layer]] = PIN_LAY,
+             pin_name:str = "P{}") -> kdb.Cell:
+    """ Create a cell with pin_count labeled pins on a square grid, 
+        pins are distributed over pin_lay layer pairs in turn.
+        pin_name is formatted with the pin index, e.g. "D[{}]" for a bus
+    """
+    cell = layout.create_cell(name)
+    columns = max(int(pin_count ** 0.5), 1)
+    layers = [(layout.layer(box), layout.layer(lbl)) for box, lbl in pin_lay]
+    for ind in range(pin_count):
+        x = (ind % columns) * PIN_PITCH
+        y = (ind // columns) * PIN_PITCH
+        box_layer, lbl_layer = layers[ind % len(layers)]
+        cell.shapes(box_layer).insert(kdb.Box(x, y, x + PIN_SIZE, y + PIN_SIZE))
+        cell.shapes(lbl_layer).insert(kdb.Text(pin_name.format(ind), kdb.Trans(x + PIN_SIZE // 2, y + PIN_SIZE // 2)))
+    return cell
+
+def add_body(layout:kdb.Layout, cell:kdb.Cell, layer_count:int, depth:int):
+    """ Fill the cell with geometry, which is not a pin: a box per layer on layer_count
+        datatype 0 layers (starting above the pin layers) and a chain of depth nested subcells,
+        each of them with the same boxes.
+    """
+    bbox = cell.bbox() if not cell.bbox().empty() else kdb.Box(0, 0, PIN_SIZE, PIN_SIZE)
+    layers = [layout.layer(Layer(100 + ind, 0)) for ind in range(layer_count)]
+    parent = cell
+    for level in range(depth + 1):
+        for layer in layers:
+            parent.shapes(layer).insert(bbox)
+        if level == depth:
+            break
+        child = layout.create_cell(f"{cell.name}_BODY{level}")
+        parent.insert(kdb.CellInstArray(child.cell_index(), kdb.Trans()))
+        parent = child
+
+def write_leafcell(directory:Path, name:str, pin_count:int,
+                   pin_lay:List[Tuple[Layer,Layer]] = PIN_LAY,
+                   pin_name:str = "P{}",
+                   layer_count:int = 0,
+                   depth:int = 0) -> Tuple[Path, Path]:
+    """ Write a leafcell with pin_count pins as name.gds and name.sp into directory,
+        the subcircuit has the same pins as the layout.
+        layer_count and depth add geometry and hierarchy to the layout, see add_body()
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    layout = kdb.Layout()
+    cell = pin_cell(layout, name, pin_count, pin_lay, pin_name)
+    if layer_count or depth:
+        add_body(layout, cell, layer_count, depth)
+    gds_path = directory/f"{name}.gds"
+    layout.write(str(gds_path))
+    names = [pin_name.format(ind) for ind in range(pin_count)]
+    pins = " ".join(names)
+    devices = "\n".join(f"R{ind} {names[ind]} {names[(ind + 1) % pin_count]} 1k" for ind in range(pin_count))
+    sp_path = directory/f"{name}.sp"
+    sp_path.write_text(f".SUBCKT {name} {pins}\n{devices}\n.ENDS {name}\n")
+    return gds_path, sp_path
@@ -0,0 +1,72 @@
+"""
+Instance terminal benchmark: instances of a cell with pin_count pins, each one connects two terminals
+and is moved once, like an item placed by its nets. Terminals of the pin table (TerminalMap,
+materialized on demand) are compared to a LayPin copy of every pin per instance.
+
+Run: python -m benchmarks.terminals [instance_count] [pin_count ...]
+"""
+import sys
+import time
+from typing import Dict, List
+
+from ic_stitcher.configurations import GlobalLayoutConfigs as config
+from ic_stitcher.configurations import kdb
+from ic_stitcher.layout.floorplaner import KDBCell, LayPin
+from ic_stitcher.layout.pin_table import PinTable, TerminalMap
+
+from .synthetic import PIN_LAY, pin_cell
+
+DEFAULT_COUNTS = [10, 100, 1000]
+
+def _copied(pins:Dict[str, LayPin], trans:kdb.Trans) -> Dict[str, LayPin]:
+    " Reference: every pin is copied and transformed for the instance "
+    res = {}
+    for pin_name, pin in pins.items():
+        terminal = pin.copy()
+        terminal.transform(trans)
+        res[pin_name] = terminal
+    return res
+
+def _place(instance_count:int, pins:Dict[str, LayPin], table:PinTable, lazy:bool) -> List[kdb.Box]:
+    " Boxes of the connected terminals after the moves "
+    names = list(pins.keys())
+    boxes = []
+    for ind in range(instance_count):
+        trans = kdb.Trans(ind % 4, False, ind * 1000, 0)
+        terminals = TerminalMap(table, trans, LayPin) if lazy else _copied(pins, trans)
+        first, second = terminals[names[0]], terminals[names[-1]]
+        displ = kdb.Vector(-first.box.left, -first.box.bottom) # Align the first terminal to the origin
+        if lazy:
+            terminals.transform(kdb.Trans(displ))
+        else:
+            for terminal in terminals.values():
+                terminal.transform(kdb.Trans(displ))
+        boxes += [first.box, second.box]
+    return boxes
+
+def run(instance_count:int, pin_count:int) -> Dict[str, float]:
+    config.PIN_LAY = PIN_LAY
+    layout = kdb.Layout()
+    pins = KDBCell(pin_cell(layout, f"PINS{pin_count}", pin_count)).pins
+    table = PinTable(pins)
+    start = time.perf_counter()
+    reference = _place(instance_count, pins, table, lazy=False)
+    copied = time.perf_counter() - start
+    start = time.perf_counter()
+    boxes = _place(instance_count, pins, table, lazy=True)
+    lazy = time.perf_counter() - start
+    if boxes != reference:
+        raise RuntimeError(f"Terminals are mismatched for {pin_count} pins")
+    return {"instances": instance_count, "pins": pin_count, "copied_s": copied, "table_s": lazy}
+
+def main(instance_count:int = 1000, counts:List[int] = DEFAULT_COUNTS):
+    print(f"{instance_count} instances")
+    print(f"{'pins':>8} {'copied, s':>12} {'table, s':>12} {'speedup':>8}")
+    for count in counts:
+        res = run(instance_count, count)
+        print(f"{res['pins']:>8} {res['copied_s']:>12.4f} {res['table_s']:>12.4f} "
+              f"{res['copied_s']/res['table_s']:>8.1f}")
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(*args[:1], counts=args[1:] or DEFAULT_COUNTS)
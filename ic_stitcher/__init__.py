@@ -1,5 +1,6 @@
-from .custom import CustomCell, LeafCell, Item
+from .custom import CustomCell, LeafCell, Item, ArrayItem, generate, preload
 from .custom import Net, NetBus, Pin, PinBus
 from .custom import R0, R90, R270, R180, M90, M180, M270
 from .configurations import GlobalConfigs, GlobalLayoutConfigs, GlobalSchematicConfigs, Layer, Mapper, register_tech
-from .klayout_pcell import register_pcell_lib
\ No newline at end of file
+from .klayout_pcell import register_pcell_lib
+from .utils.Logging import set_log_level, quiet
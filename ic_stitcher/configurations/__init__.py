@@ -3,6 +3,7 @@ from .schematic_configs import *
 #from .abstract import *
 from .global_configs import *
 from .global_configs import _IS_KLAYOUT
+from .leafcell_index import LEAFCELLS, LeafCellIndex, LeafCellEntry
 
 from typing import List
 
@@ -16,9 +17,4 @@ def register_tech(lyt_file:str):
     new_tech = kdb.Technology()
     new_tech.load(lyt_file)
     REGISTERED_TECHS.append(kdb.Technology.register_technology(new_tech))
-        
-def _GET_LEAFCELL(name:str, pathes:List[Path]):
-    for path in pathes:
-        if Path(path).stem == name:
-            return path
-    return None
\ No newline at end of file
+
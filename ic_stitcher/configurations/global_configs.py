@@ -62,4 +62,12 @@ class GlobalConfigs():
     NO_LAYOUT = False
     
     # Used to disable netlist from creating and loading
-    NO_NETLIST = False
\ No newline at end of file
+    NO_NETLIST = False
+    
+    # Directory of built custom cells, reused by CustomCell.cached() while the cell class source,
+    # its arguments, the used leafcells and the configurations stay the same. Disabled if None
+    BUILD_CACHE_DIR = None
+    
+    # Record wall time and call counts of the build phases (leafcell reads, pin extraction, cell copies,
+    # moves, writers) into the stats of each cell, see _BaseCell.stats and ic_stitcher.utils.stats
+    COLLECT_STATS:bool = False
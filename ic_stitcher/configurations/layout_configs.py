@@ -5,7 +5,7 @@ from .global_configs import GlobalConfigs as glconf
 from .global_configs import Layer, Mapper
 
 class GlobalLayoutConfigs():
-    # Define the list of pathes to layout leafcells, 
+    # Define the list of pathes to layout leafcells (.gds, .gds.gz, .oas) or directories with them,
     # best to use Path().glob(your_pattern)
     LEAFCELL_PATH:List[Union[Path, str]] = []
     
@@ -26,5 +26,36 @@ class GlobalLayoutConfigs():
     # Specifies whether other layers shall be created during file reading
     CREATE_OTHER_LAYERS:bool = True
     
+    # Directory to keep extracted pins of leafcells between runs, disabled if None.
+    # Pins are reused while the leafcell file, PIN_LAY and INPUT_MAPPER stay the same
+    PIN_CACHE_DIR:Union[Path, str, None] = None
+    
+    # Build all custom cells in one shared layout, subcells are referenced instead of copied 
+    # into each parent. Call reset_shared_layout() from layout.floorplaner to start a new build
+    SHARED_LAYOUT:bool = False
+    
+    # Record pin-to-pin constraints of items and move each instance once, when the cell 
+    # is saved or placed into a parent (or on CustomLayoutCell.place()), instead of on every connection.
+    # Unsatisfiable connections are collected in CustomLayoutCell.conflicts
+    DEFERRED_PLACEMENT:bool = False
+    
+    # Write modification times into saved GDS files, disable it to get reproducible files
+    WRITE_TIMESTAMPS:bool = True
+    
+    # Remove orphan cells and merge identical copies of a cell ("cell$1" of the same leafcell
+    # in different subcells) before a layout is saved, the saved cell is modified in place.
+    # Not applied to the shared layout
+    COMPACT_ON_SAVE:bool = False
+    
+    # Format of saved layouts, if the file name has no known suffix (claim() uses it for the suffix):
+    # "gds", "gds.gz" (gzip compressed GDS2) or "oas" (OASIS)
+    OUTPUT_FORMAT:str = "gds"
+    
+    # OASIS output: compression level (0-10, shape arrays search), CBLOCK compression of records
+    # and strict mode (name tables with offsets, needed by some tools for a fast access)
+    OASIS_COMPRESSION:int = 2
+    OASIS_CBLOCKS:bool = True
+    OASIS_STRICT:bool = True
+    
     
     
\ No newline at end of file
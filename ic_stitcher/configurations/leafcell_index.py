@@ -0,0 +1,209 @@
+import os
+import re
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple, Union
+
+from .layout_configs import GlobalLayoutConfigs
+from .schematic_configs import GlobalSchematicConfigs
+
+# Recognized leafcell file suffixes, the longest ones go first (".gds.gz" before ".gz")
+LAYOUT_SUFFIXES:Tuple[str,...] = (".gds.gz", ".gds", ".oas")
+NETLIST_SUFFIXES:Tuple[str,...] = (".sp", ".cir")
+
+_SUBCKT_RE = re.compile(r"^[ \t]*\.subckt[ \t]+(\S+)", re.IGNORECASE | re.MULTILINE)
+
+def _strip_suffix(file_name:str, suffixes:Tuple[str,...]) -> Union[str,None]:
+    " Return a cell name of the file, or None if the file is not of a leafcell type "
+    lowered = file_name.lower()
+    for suffix in suffixes:
+        if lowered.endswith(suffix):
+            return file_name[:-len(suffix)]
+    return None
+
+class LeafCellEntry():
+    """ Leafcell file, found by the index """
+    def __init__(self, name:str, path:Path, mtime:float) -> None:
+        self.name = name
+        self.path = path
+        self.mtime = mtime
+
+    def __str__(self):
+        return f"{self.name} ({self.path})"
+
+    def __repr__(self):
+        return str(self)
+
+class _PathTable():
+    """ Name -> file table of one kind of leafcells (layout or netlist).
+        The table is built from a LEAFCELL_PATH value, which can be a list or
+        a one-shot generator (Path().glob()). A list is compared by its contents, so in-place
+        changes are found, a generator is materialized once.
+        Directories are scanned for the files of the suffixes, listed files are taken by the stem.
+    """
+    def __init__(self, suffixes:Tuple[str,...]) -> None:
+        self.suffixes = suffixes
+        self._source = None # LEAFCELL_PATH object, the table is built from
+        self._snapshot:Union[tuple,None] = None # Contents of a list source
+        self._pathes:List[Path] = []
+        self._entries:Dict[str, LeafCellEntry] = {}
+        self._dir_mtimes:Dict[Path, float] = {}
+
+    def _add_file(self, path:Path, listed:bool = False):
+        name = _strip_suffix(path.name, self.suffixes)
+        if name is None and listed: # Any listed file, e.g. a .cdl netlist
+            name = path.stem
+        if name is None or name in self._entries: # The first one wins
+            return None
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return None
+        self._entries[name] = LeafCellEntry(name, path, mtime)
+
+    def _scan(self):
+        self._entries = {}
+        self._dir_mtimes = {}
+        for path in self._pathes:
+            if path.is_dir():
+                self._dir_mtimes[path] = os.stat(path).st_mtime
+                for file in sorted(path.rglob("*")):
+                    if file.is_file():
+                        self._add_file(file)
+                continue
+            self._add_file(path, listed=True)
+            parent = path.parent
+            if parent not in self._dir_mtimes and parent.exists():
+                self._dir_mtimes[parent] = os.stat(parent).st_mtime
+
+    def _is_dir_modified(self) -> bool:
+        for path, mtime in self._dir_mtimes.items():
+            try:
+                if os.stat(path).st_mtime != mtime:
+                    return True
+            except OSError:
+                return True
+        return False
+
+    def update(self, source:Iterable[Union[Path,str]]):
+        " Rebuild the table, if LEAFCELL_PATH was reassigned or its list was modified "
+        if isinstance(source, (list, tuple)):
+            snapshot = tuple(source)
+            if source is self._source and snapshot == self._snapshot:
+                return None
+            self._snapshot = snapshot
+        elif source is self._source: # One-shot iterator, it's read only once
+            return None
+        else:
+            self._snapshot = None
+        self._source = source
+        self._pathes = [Path(path) for path in source]
+        self._scan()
+
+    def find(self, name:str) -> Union[LeafCellEntry,None]:
+        entry = self._entries.get(name)
+        if entry is None:
+            if not self._is_dir_modified():
+                return None
+            self._scan()
+            return self._entries.get(name)
+        try:
+            mtime = os.stat(entry.path).st_mtime
+        except OSError: # Removed or renamed, find it again
+            self._scan()
+            return self._entries.get(name)
+        if mtime != entry.mtime: # Invalidate the entry
+            entry = LeafCellEntry(name, entry.path, mtime)
+            self._entries[name] = entry
+        return entry
+
+    def names(self) -> List[str]:
+        return list(self._entries.keys())
+
+class _NetlistTable(_PathTable):
+    """ Netlist files, a cell is found by the file name or by a .SUBCKT in any of the files.
+        Files are scanned for .SUBCKT lines only on a miss, libraries with many subcircuits
+        are parsed later once (see schematic.netlister.SPICE_LIBRARY)
+    """
+    def __init__(self, suffixes:Tuple[str,...]) -> None:
+        super().__init__(suffixes)
+        self._subcircuits:Dict[str, LeafCellEntry] = {} # Case folded subcircuit name -> file
+        self._scanned:Dict[Path, float] = {} # Scanned files and their modification time
+
+    def _scan_subcircuits(self, path:Path, mtime:float):
+        self._subcircuits = {key: entry for key, entry in self._subcircuits.items() if entry.path != path}
+        self._scanned[path] = mtime
+        try:
+            with open(path, errors="replace") as file:
+                text = file.read()
+        except OSError:
+            return None
+        for name in _SUBCKT_RE.findall(text):
+            self._subcircuits.setdefault(name.casefold(), LeafCellEntry(name, path, mtime))
+
+    def _find_subcircuit(self, name:str) -> Union[LeafCellEntry,None]:
+        key = name.casefold()
+        entry = self._subcircuits.get(key)
+        if entry is not None:
+            try:
+                if os.stat(entry.path).st_mtime == entry.mtime:
+                    return entry
+            except OSError:
+                pass
+        for file_entry in list(self._entries.values()):
+            try:
+                mtime = os.stat(file_entry.path).st_mtime
+            except OSError:
+                continue
+            if self._scanned.get(file_entry.path) != mtime:
+                self._scan_subcircuits(file_entry.path, mtime)
+        return self._subcircuits.get(key)
+
+    def find(self, name:str) -> Union[LeafCellEntry,None]:
+        entry = super().find(name)
+        if entry is None:
+            entry = self._find_subcircuit(name)
+        return entry
+
+class LeafCellIndex():
+    """ Shared index of leafcells, mapping cell names to layout and netlist files.
+        LEAFCELL_PATH of the layout and schematic configurations are scanned once,
+        entries are invalidated by the file modification time.
+        A netlist is found by its file name or by a .SUBCKT of a library file.
+    """
+    def __init__(self) -> None:
+        self._layouts = _PathTable(LAYOUT_SUFFIXES)
+        self._netlists = _NetlistTable(NETLIST_SUFFIXES)
+
+    def layout_entry(self, name:str) -> Union[LeafCellEntry,None]:
+        self._layouts.update(GlobalLayoutConfigs.LEAFCELL_PATH)
+        return self._layouts.find(name)
+
+    def netlist_entry(self, name:str) -> Union[LeafCellEntry,None]:
+        self._netlists.update(GlobalSchematicConfigs.LEAFCELL_PATH)
+        return self._netlists.find(name)
+
+    def layout(self, name:str) -> Union[Path,None]:
+        entry = self.layout_entry(name)
+        return entry.path if entry else None
+
+    def netlist(self, name:str) -> Union[Path,None]:
+        entry = self.netlist_entry(name)
+        return entry.path if entry else None
+
+    def stamp(self, name:str) -> Tuple[Union[float,None], Union[float,None]]:
+        " Modification times of the layout and netlist files, used to detect changed leafcells "
+        lay_entry = self.layout_entry(name)
+        sch_entry = self.netlist_entry(name)
+        return (lay_entry.mtime if lay_entry else None,
+                sch_entry.mtime if sch_entry else None)
+
+    def layout_names(self) -> List[str]:
+        self._layouts.update(GlobalLayoutConfigs.LEAFCELL_PATH)
+        return self._layouts.names()
+
+    def netlist_names(self) -> List[str]:
+        self._netlists.update(GlobalSchematicConfigs.LEAFCELL_PATH)
+        return self._netlists.names()
+
+# Shared index for all leafcell lookups
+LEAFCELLS = LeafCellIndex()
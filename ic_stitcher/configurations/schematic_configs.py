@@ -4,7 +4,7 @@ from pathlib import Path
 from .global_configs import GlobalConfigs as glconf
 
 class GlobalSchematicConfigs():
-    # Define the list of pathes to layout leafcells
+    # Define the list of pathes to netlist leafcells (.sp, .cir) or directories with them
     # Better use glob from pathlib.Path
     LEAFCELL_PATH:List[Union[Path,str]] = []
     
@@ -17,6 +17,10 @@ class GlobalSchematicConfigs():
     # Indicating whether to embed comments for position etc. (true) or not (false).
     SAVE_WITH_COMMENTS:bool = False
     
+    # Build all custom cells in one shared netlist, subcircuits refer to the existing circuits instead of
+    # copies in each parent. Call reset_shared_netlist() from schematic.netlister to start a new build
+    SHARED_NETLIST:bool = False
+    
     # Print more information on Layout building
     VERBOSE = glconf.VERBOSE
     
\ No newline at end of file
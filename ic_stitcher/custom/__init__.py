@@ -1,2 +1,5 @@
 from .custom_cell import *
-from .connections import *
\ No newline at end of file
+from .connections import *
+from .preload import preload, PreloadReport
+from .generator import generate, VariantResult
+from .build_cache import BuildCache, CachedCell, BUILD_CACHE
@@ -0,0 +1,256 @@
+"""
+Content-addressed cache of built custom cells, see GlobalConfigs.BUILD_CACHE_DIR.
+An entry is keyed by the source of the CustomCell subclass, its constructor arguments and
+the configurations. Its manifest lists the leafcells and custom cell classes, the cell depends on,
+so a modified leafcell invalidates only the cells, which use it.
+A hit is restored from the cached GDS/CDL and the pin table without running the cell code.
+"""
+import os
+import sys
+import json
+import shutil
+import inspect
+import hashlib
+import logging
+from pathlib import Path
+from typing import Any, Dict, Tuple, Type, Union
+
+from ic_stitcher.configurations import GlobalConfigs as globconf
+from ic_stitcher.configurations import GlobalLayoutConfigs as layconf
+from ic_stitcher.configurations import GlobalSchematicConfigs as schconf
+from ic_stitcher.configurations import LEAFCELLS, kdb
+from ic_stitcher.layout.floorplaner import LayLeafCell, layout_suffix
+from ic_stitcher.layout.pin_cache import cached_file_hash, config_key
+from ic_stitcher.schematic.netlister import LeafNetlistCell, SPICE_LIBRARY
+from ic_stitcher.custom.custom_cell import CustomCell, LeafCell
+
+LOGGER = logging.getLogger(__name__)
+
+# Version of the entry format, change it to invalidate all caches
+CACHE_VERSION = 2
+
+class _Uncacheable(Exception):
+    " The cell can't be keyed, it's built as usual "
+
+class CachedCell(LeafCell):
+    """ Custom cell, restored from the build cache. It's used as a subcell like a LeafCell """
+    def __new__(cls, *args, **kwargs): # Not shared by name, unlike LeafCell
+        return object.__new__(cls)
+
+    def __init__(self, cell_name:str, layout:Union[LayLeafCell,None],
+                 netlist:Union[LeafNetlistCell,None], manifest:Dict[str, Any]):
+        self.manifest = manifest
+        self._setup(cell_name, layout, netlist, check_pins_mismatch=False)
+
+def _class_name(cls:type) -> str:
+    return f"{cls.__module__}:{cls.__qualname__}"
+
+_SOURCE_HASHES:Dict[type, str] = {}
+
+def _source_hash(cls:Type[CustomCell]) -> str:
+    " Hash of the class source, including the custom base classes "
+    if cls not in _SOURCE_HASHES:
+        sha = hashlib.sha256()
+        for base in cls.__mro__:
+            if base is CustomCell:
+                break
+            try:
+                sha.update(inspect.getsource(base).encode())
+            except (OSError, TypeError) as exc: # Defined interactively
+                raise _Uncacheable(f"no source of {_class_name(base)}: {exc}")
+        _SOURCE_HASHES[cls] = sha.hexdigest()
+    return _SOURCE_HASHES[cls]
+
+def _find_class(name:str) -> Union[type,None]:
+    module_name, qualname = name.split(":", maxsplit=1)
+    obj = sys.modules.get(module_name)
+    for part in qualname.split("."):
+        obj = getattr(obj, part, None)
+    return obj if isinstance(obj, type) else None
+
+def _leaf_hashes(name:str) -> Tuple[Union[str,None], Union[str,None]]:
+    lay_path = LEAFCELLS.layout(name)
+    sch_path = LEAFCELLS.netlist(name)
+    return (cached_file_hash(lay_path) if lay_path else None,
+            cached_file_hash(sch_path) if sch_path else None)
+
+def _dependencies(cell:CustomCell, leafs:Dict[str, Any], classes:Dict[str, str]):
+    " Collect leafcells and custom cell classes, the cell is built from "
+    classes[_class_name(type(cell))] = _source_hash(type(cell))
+    for item in cell.items.values():
+        sub = item.cell
+        if isinstance(sub, CachedCell):
+            leafs.update(sub.manifest["leafcells"])
+            classes.update(sub.manifest["classes"])
+        elif isinstance(sub, LeafCell):
+            leafs[sub.name] = list(_leaf_hashes(sub.name))
+        elif isinstance(sub, CustomCell):
+            _dependencies(sub, leafs, classes)
+
+def _netlist_names(circuit:kdb.Circuit, names:Dict[str, Any]):
+    """ Collect the names of the circuit subtree, which the SPICE reader uppercases:
+        circuit name (uppercased) -> original names of the circuit, its pins, nets, subcircuits and devices
+    """
+    if circuit.name.upper() in names:
+        return
+    def changed(objs):
+        return {obj_name.upper(): obj_name for obj_name in objs if obj_name and obj_name != obj_name.upper()}
+    names[circuit.name.upper()] = {
+        "name": circuit.name,
+        "pins": changed(pin.name() for pin in circuit.each_pin()),
+        "nets": changed(net.name for net in circuit.each_net()),
+        "subcircuits": changed(sub.name for sub in circuit.each_subcircuit()),
+        "devices": changed(device.name for device in circuit.each_device()),
+    }
+    for sub in circuit.each_subcircuit():
+        _netlist_names(sub.circuit_ref(), names)
+
+def _restore_names(netlist:kdb.Netlist, names:Dict[str, Any]):
+    " Give the circuits, read from a cached CDL, their names of the original build "
+    for circuit in netlist.each_circuit():
+        entry = names.get(circuit.name.upper())
+        if entry is None:
+            continue
+        circuit.name = entry["name"]
+        for pin in circuit.each_pin():
+            if pin.name() in entry["pins"]:
+                circuit.rename_pin(pin.id(), entry["pins"][pin.name()])
+        for net in circuit.each_net():
+            net.name = entry["nets"].get(net.name, net.name)
+        for sub in circuit.each_subcircuit():
+            sub.name = entry["subcircuits"].get(sub.name, sub.name)
+        for device in circuit.each_device():
+            device.name = entry["devices"].get(device.name, device.name)
+    netlist.case_sensitive = True # Like a built netlist, the lowercase names are found only then
+
+def _config_key() -> str:
+    return "|".join([config_key(),
+                     str(layconf.INSTANCE_LABEL_LAYER),
+                     globconf.SUBNET_DELIMITER,
+                     "".join(globconf.BUS_BRACKETS),
+                     ",".join(schconf.NETLIST_PRIMITIVES),
+                     str(schconf.SAVE_USE_NET_NAMES)])
+
+class BuildCache():
+    """ Directory of built custom cells, disabled when cache_dir is None """
+    def __init__(self, cache_dir:Union[Path,str,None] = None) -> None:
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def directory(self) -> Union[Path,None]:
+        cache_dir = self.cache_dir if self.cache_dir is not None else globconf.BUILD_CACHE_DIR
+        if cache_dir is None:
+            return None
+        return Path(cache_dir)
+
+    def key(self, cls:Type[CustomCell], args:tuple, kwargs:Dict[str, Any]) -> str:
+        arguments = repr((args, sorted(kwargs.items())))
+        if " at 0x" in arguments: # Default repr of an object differs between runs
+            raise _Uncacheable(f"arguments have no stable representation: {arguments}")
+        sha = hashlib.sha256()
+        for part in (_class_name(cls), _source_hash(cls), arguments, _config_key(), str(CACHE_VERSION)):
+            sha.update(part.encode())
+            sha.update(b"\0")
+        return sha.hexdigest()
+
+    def _is_valid(self, manifest:Dict[str, Any]) -> bool:
+        " Dependencies of the entry are not modified since "
+        for name, hashes in manifest["leafcells"].items():
+            if list(_leaf_hashes(name)) != hashes:
+                LOGGER.debug(f"leafcell '{name}' is modified, rebuilding '{manifest['cell_name']}'")
+                return False
+        for class_name, source_hash in manifest["classes"].items():
+            cls = _find_class(class_name)
+            if cls is None: # Not imported, it can't be verified
+                return False
+            try:
+                if _source_hash(cls) != source_hash:
+                    return False
+            except _Uncacheable:
+                return False
+        return True
+
+    def load(self, key:str) -> Union[CachedCell,None]:
+        directory = self.directory
+        if directory is None:
+            return None
+        entry = directory/key
+        try:
+            manifest = json.loads((entry/"manifest.json").read_text())
+        except (OSError, ValueError):
+            return None
+        if manifest.get("version") != CACHE_VERSION or not self._is_valid(manifest):
+            return None
+        name = manifest["cell_name"]
+        layout, netlist = None, None
+        if manifest["layout"]:
+            rows = [tuple(row) for row in manifest["pins"]]
+            layout = LayLeafCell(name, rows, path=entry/manifest["layout"])
+        if manifest["netlist"]:
+            # The SPICE reader uppercases the names, pins have to match the layout and the parents
+            _restore_names(SPICE_LIBRARY.read(entry/manifest["netlist"]), manifest["netlist_names"])
+            netlist = LeafNetlistCell(name, path=entry/manifest["netlist"])
+        LOGGER.info(f"Restored '{name}' from the build cache")
+        return CachedCell(name, layout, netlist, manifest)
+
+    def save(self, key:str, cell:CustomCell):
+        directory = self.directory
+        if directory is None:
+            return None
+        leafs:Dict[str, Any] = {}
+        classes:Dict[str, str] = {}
+        _dependencies(cell, leafs, classes)
+        netlist_names:Dict[str, Any] = {}
+        if cell.netlist:
+            _netlist_names(cell.netlist.kdb_circuit, netlist_names)
+        # Files are written into a temporary directory, which replaces the entry at once
+        entry = directory/key
+        tmp_entry = directory/f"{key}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp_entry, ignore_errors=True)
+        tmp_entry.mkdir(parents=True)
+        layfile = f"{cell.name}{layout_suffix()}" if cell.layout else ""
+        schfile = f"{cell.name}.cdl" if cell.netlist else ""
+        cell.claim(str(tmp_entry),
+                   layfile=str(tmp_entry/layfile) if layfile else "",
+                   schfile=str(tmp_entry/schfile) if schfile else "")
+        manifest = {
+            "version": CACHE_VERSION,
+            "cell_name": cell.name,
+            "class": _class_name(type(cell)),
+            "layout": layfile or None,
+            "netlist": schfile or None,
+            "pins": [pin.to_row() for pin in cell.layout.pins.values()] if cell.layout else [],
+            "netlist_names": netlist_names,
+            "leafcells": leafs,
+            "classes": classes,
+        }
+        (tmp_entry/"manifest.json").write_text(json.dumps(manifest, indent=1))
+        shutil.rmtree(entry, ignore_errors=True)
+        os.replace(tmp_entry, entry)
+
+    def get(self, cls:Type[CustomCell], *args, **kwargs) -> Union[CustomCell, CachedCell]:
+        " Restore the cell from the cache or build it and store it "
+        try:
+            key = self.key(cls, args, kwargs) if self.directory is not None else None
+        except _Uncacheable as exc:
+            LOGGER.debug(f"{cls.__name__} is not cached: {exc}")
+            key = None
+        if key is None:
+            return cls(*args, **kwargs)
+        cell = self.load(key)
+        if cell is not None:
+            self.hits += 1
+            return cell
+        self.misses += 1
+        cell = cls(*args, **kwargs)
+        try:
+            self.save(key, cell)
+        except (KeyboardInterrupt, SystemExit):
+            raise
+        except BaseException as exc: # The cell is built anyway, only the cache entry is missing
+            LOGGER.warning(f"Failed to store '{cell.name}' in the build cache: {exc}")
+        return cell
+
+BUILD_CACHE = BuildCache()
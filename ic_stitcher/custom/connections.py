@@ -1,4 +1,5 @@
-from typing import TypeVar, Union, Dict, List, Type, Generic
+import sys
+from typing import TypeVar, Union, Dict, List, Tuple, Type, Generic
 from ic_stitcher.configurations import GlobalConfigs as globconf
 from ic_stitcher.configurations import remove_suffix
 
@@ -8,6 +9,7 @@ from ic_stitcher.schematic.netlister import *
 LAY_CONN = TypeVar("CONN")
 SCH_CONN = TypeVar("SCH_CONN")
 class ConnectionBit(Generic[LAY_CONN, SCH_CONN]):
+    __slots__ = ("delimiter", "full_name", "_lay_name", "_layout", "_sch_name", "_netlist")
     def __init__(self, name:str, 
                  suffix:Union[str,int] = None,
                  index:int = None,
@@ -22,8 +24,9 @@ class ConnectionBit(Generic[LAY_CONN, SCH_CONN]):
         indexed = ""
         if index is not None and index != "":
             indexed = f"{bus_l}{index}{bus_r}"
-        no_suffix = name+indexed
-        self.full_name = name+suffixed+indexed
+        # Names are interned, they're repeated in the layout and netlist objects and in the tables
+        no_suffix = sys.intern(name+indexed)
+        self.full_name = sys.intern(name+suffixed+indexed)
         self._lay_name:LAY_CONN = self.full_name if full_name_layout else no_suffix
         self._layout:LAY_CONN = None
         self._sch_name:SCH_CONN = self.full_name if full_name_netlist else no_suffix
@@ -49,10 +52,12 @@ class ConnectionBit(Generic[LAY_CONN, SCH_CONN]):
         return cls(subname, suffix=suffix, index=index)
 
 class Pin(ConnectionBit[Union[PlacedPin,LayPin,None],Union[NetlistPin,None]]):
+    __slots__ = ()
     def __str__(self):
         return f"Pin:{self.full_name}"
     
 class Net(ConnectionBit[Union[LayNet,None],Union[NetlistNet,None]]):
+    __slots__ = ("pin",)
     def __init__(self, name, suffix = None, index = None, full_name_layout=True, full_name_netlist=True):
         super().__init__(name, suffix=suffix, index=index, 
                          full_name_layout=full_name_layout, 
@@ -64,6 +69,11 @@ class Net(ConnectionBit[Union[LayNet,None],Union[NetlistNet,None]]):
 
 BUSTYPE = TypeVar("BUSTYPE", bound=ConnectionBit)
 class _Bus(List[BUSTYPE]):
+    """ Bus of bits, a list of the bit objects.
+        A bus or its slice (bus[0:8]) is a connection value of an Item for a bus pin of the cell.
+        The bits are created with the bus: list methods (iteration, len, +, ==) read the stored items
+        and don't call __getitem__, so they can't be created on the first access
+    """
     _type:Type[BUSTYPE] = ConnectionBit
     def __init__(self, name:str, size:int, 
                  suffix:Union[str,int] = None,
@@ -76,6 +86,18 @@ class _Bus(List[BUSTYPE]):
                                    suffix = suffix,
                                    full_name_layout = full_name_layout,
                                    full_name_netlist = full_name_netlist))
+
+    def bits(self) -> List[BUSTYPE]:
+        return list(self)
+
+    def __getitem__(self, index:Union[int,slice]) -> Union[BUSTYPE, "BusSlice[BUSTYPE]"]:
+        if isinstance(index, slice):
+            return BusSlice(self, range(len(self))[index])
+        return super().__getitem__(index)
+
+    def __add__(self, other:List[BUSTYPE]) -> Union["BusSlice[BUSTYPE]", List[BUSTYPE]]:
+        return self[:] + other
+
     def connection(self, base_name:str, 
                    stop = None,
                    start = 0, 
@@ -90,10 +112,54 @@ class _Bus(List[BUSTYPE]):
         res:Dict[str,BUSTYPE] = {}
         for bit in range(start, stop, step):
             res[ConnectionBit(base_name, index=bit).full_name] = self[bit]
-        
+        return res
+
+    def __repr__(self):
+        return f"{type(self).__name__}:{self.name}[{len(self)}]"
+
+def _indices(indices:List[int]) -> Union[range, Tuple[int, ...]]:
+    " Bit indices as a range, if they're evenly spaced "
+    if len(indices) > 1:
+        step = indices[1] - indices[0]
+        if step != 0 and all(second - first == step for first, second in zip(indices, indices[1:])):
+            return range(indices[0], indices[-1] + step, step)
+    if len(indices) == 1:
+        return range(indices[0], indices[0] + 1)
+    return tuple(indices)
+
+class BusSlice(List[BUSTYPE]):
+    """ Bits of a bus in a range, like bus[0:512]. It's a list of the bits, which knows its bus.
+        Slices of the same bus are joined into a slice: bus[0:4] + bus[4:8]
+    """
+    def __init__(self, bus:_Bus[BUSTYPE], indices:Union[range, Tuple[int, ...]]) -> None:
+        super().__init__(list.__getitem__(bus, index) for index in indices)
+        self.bus = bus
+        self.indices = indices
+
+    def bits(self) -> List[BUSTYPE]:
+        return list(self)
+
+    def __getitem__(self, index:Union[int,slice]) -> Union[BUSTYPE, "BusSlice[BUSTYPE]"]:
+        if isinstance(index, slice):
+            indices = self.indices[index]
+            return BusSlice(self.bus, indices if isinstance(indices, range) else _indices(indices))
+        return super().__getitem__(index)
+
+    def __add__(self, other:List[BUSTYPE]) -> Union["BusSlice[BUSTYPE]", List[BUSTYPE]]:
+        if isinstance(other, _Bus):
+            other = other[:]
+        if isinstance(other, BusSlice) and other.bus is self.bus:
+            return BusSlice(self.bus, _indices([*self.indices, *other.indices]))
+        return super().__add__(other)
+
+    def __repr__(self):
+        if not isinstance(self.indices, range):
+            return f"{type(self.bus).__name__}:{self.bus.name}[{','.join(map(str, self.indices))}]"
+        step = f":{self.indices.step}" if self.indices.step != 1 else ""
+        return f"{type(self.bus).__name__}:{self.bus.name}[{self.indices.start}:{self.indices.stop}{step}]"
+
 class NetBus(_Bus[Net]): 
     _type = Net
     
 class PinBus(_Bus[Pin]):
     _type = Pin
-        
\ No newline at end of file
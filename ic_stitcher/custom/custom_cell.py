@@ -1,20 +1,29 @@
 #from __future__ import annotations
 import logging
-from typing import Union, Dict
+from typing import Union, Dict, List, Tuple
 from abc import ABC
 
 from ic_stitcher.layout.floorplaner import * 
 from ic_stitcher.schematic.netlister import * 
-from ic_stitcher.utils.Logging import addStreamHandler
+from ic_stitcher.utils.Logging import cell_logger
+from ic_stitcher.utils import stats
+from ic_stitcher.utils.stats import BuildStats
+from ic_stitcher.configurations import LEAFCELLS
+from ic_stitcher.configurations import GlobalConfigs as globconf
 #import klayout_plugin.ip_builder.schematic.netlister as netlist
 
-from ic_stitcher.custom.connections import Pin, Net
+from ic_stitcher.custom.connections import Pin, Net, BusSlice, _Bus
 
 class ICStitchError(BaseException): ...
 
+Connection = Union[str, Pin, Net, _Bus, BusSlice]
+
 class Item():
+    """ Instance of a subcell. A connection is a net of a pin or, for a bus pin of the cell
+        (e.g. "D" of pins "D[0]"..."D[511]"), a NetBus/PinBus or its slice of the same width
+    """
     def __init__(self, subcell:Union["CustomCell", "LeafCell"],
-                 connections:Dict[str,Union[str,Pin,Net]],
+                 connections:Dict[str,Connection],
                  trans = R0) -> None:
         if not isinstance(subcell, (CustomCell,LeafCell)):
             raise ICStitchError(f"Error: unsupported type of a subcell {subcell.__class__}, expect CustomCell or LeafCell")
@@ -22,30 +31,49 @@ class Item():
         self.trans = trans
         self.cell_name:str = subcell.name
         self.is_instantiated = False
-        self.connections:Dict[str,Net] = self._map_connections(connections)
+        self.connections:Dict[str,Net] = self._map_connections(connections) # Nets once bound
         self.instance_name:Union[str,None] = None
         self._lay_instance:Union[CustomInstance,None] = None
         self._sch_instance:Union[CustomNetlistInstance,None] = None
         
-    def _map_connections(self, connections:Dict[str,Union[str,Pin,Net]]) -> Dict[str,Net]:
+    @staticmethod
+    def _is_pattern(conn:Connection) -> bool:
+        " Connection, which is resolved per element of an ArrayItem "
+        return False
+
+    def _map_connections(self, connections:Dict[str,Connection]) -> Dict[str,Union[str,Pin,Net]]:
+        " Connections of the pins, resolved to the nets of the parent cell by _bind() "
         res = {}
+        self._display:Dict[str,Connection] = {} # Buses are not expanded in the log
         for term, conn in connections.items():
-            net = None
-            if isinstance(conn, Pin):
-                net = Net(conn.full_name)
-                net.pin = conn
-            elif isinstance(conn, Net):
-                net = conn
-            elif isinstance(conn, str):
-                net = Net(conn)
-            else:
-                msg = f"Unexpected type of the contact must be Pin, Net or str, given {type(conn)}"
+            if isinstance(conn, (_Bus, BusSlice)):
+                pin_names = self.cell.bus_pins().get(term)
+                if pin_names is None:
+                    raise ICStitchError(f"BUS '{term}' is not in the cell '{self.cell_name}'")
+                if len(pin_names) != len(conn):
+                    msg = f"BUS '{term}' of the cell '{self.cell_name}' has {len(pin_names)} bits, given {conn!r}"
+                    raise ICStitchError(msg)
+                res.update(zip(pin_names, conn.bits()))
+                self._display[term] = conn
+                continue
+            if not isinstance(conn, (str, Pin, Net)):
+                msg = f"Unexpected type of the contact must be Pin, Net, str or a bus, given {type(conn)}"
                 raise ICStitchError(msg)
             pin = self.cell.pins.get(term)
             if pin is None:
                 raise ICStitchError(f"PIN '{term}' is not in the cell '{self.cell_name}'")
-            res[pin.full_name] = net
+            res[pin.full_name] = conn
+            self._display[pin.full_name] = conn
         return res
+
+    def _bind(self, parent:"_BaseCell"):
+        " Resolve the connections to the nets of the parent cell, one Net object per name "
+        intern_net = parent.intern_net
+        self.connections = {term: conn if self._is_pattern(conn) else intern_net(conn)
+                            for term, conn in self.connections.items()}
+        for term, conn in self._display.items():
+            if term in self.connections:
+                self._display[term] = self.connections[term]
     
     def _connect_layout(self, parent_lay:CustomLayoutCell):
         lay_instance = parent_lay.insert(self.instance_name, self.cell.layout, self.trans)
@@ -53,10 +81,11 @@ class Item():
             net_name = cell_net._lay_name
             if cell_net._layout is None: # Create a Layout Net
                 ref_pin = lay_instance.terminals[term]
-                cell_net._layout = parent_lay.add_net(net_name, ref_pin)
-                if cell_net.pin:
-                    pin_name = cell_net.pin._lay_name
-                    cell_net.pin._layout = parent_lay.add_pin(cell_net._layout, pin_name)
+                cell_net._layout = parent_lay.add_net(net_name, ref_pin, lay_instance)
+            # A net can become a pin later. The Pin object can be shared by many cells,
+            # so the pin is looked up in this cell
+            if cell_net.pin and cell_net._layout.top_pin is None:
+                parent_lay.add_pin(cell_net._layout, cell_net.pin._lay_name)
             lay_instance.connect(term, cell_net._layout)
         self._lay_instance = lay_instance
         
@@ -66,36 +95,205 @@ class Item():
             net_name = cell_net._sch_name
             if cell_net._netlist is None: # Create a Netlist Net
                 cell_net._netlist = parent_sch.add_net(net_name)
-                if cell_net.pin:
-                    pin_name = cell_net.pin._sch_name
-                    cell_net.pin._netlist = parent_sch.add_pin(cell_net._netlist, pin_name)
+            if cell_net.pin and cell_net.pin._sch_name not in parent_sch.pins:
+                parent_sch.add_pin(cell_net._netlist, cell_net.pin._sch_name)
             sch_instance.connect(term, cell_net._netlist)
         self._sch_instance = sch_instance
     
+    def top_pins(self) -> List[Pin]:
+        " Pins of the parent cell, connected by this item "
+        return [cell_net.pin for cell_net in self.connections.values() if cell_net.pin is not None]
+    
+    def __str__(self):
+        return f"{self.instance_name} ({self.cell_name}) {self._display}"
+
+class ArrayItem(Item):
+    """ Regular na x nb array of a subcell, placed as one instance array.
+        Element (col, row) is displaced by a*col + b*row, by default cells are abutted.
+        A connection name may be a pattern with {col} and {row} fields, e.g. "WL[{row}]",
+        to connect elements to different nets, other connections are shared by all elements.
+    """
+    def __init__(self, subcell:Union["CustomCell", "LeafCell"],
+                 connections:Dict[str,Connection],
+                 na:int, nb:int = 1,
+                 a:kdb.Vector = None, b:kdb.Vector = None,
+                 trans = R0) -> None:
+        if na < 1 or nb < 1:
+            raise ICStitchError(f"Array size must be positive, given {na}x{nb}")
+        self.na = na
+        self.nb = nb
+        self._resolved:Dict[str, Net] = {} # Nets of the patterns
+        super().__init__(subcell, connections, trans)
+        if a is None or b is None:
+            bbox = subcell.layout.kdb_cell.bbox().transformed(trans)
+            a = kdb.Vector(bbox.width(), 0) if a is None else a
+            b = kdb.Vector(0, bbox.height()) if b is None else b
+        self.a = a
+        self.b = b
+        
+    def _map_connections(self, connections:Dict[str,Connection]) -> Dict[str,Net]:
+        patterns = {term: conn for term, conn in connections.items() if self._is_pattern(conn)}
+        res = super()._map_connections({term: conn for term, conn in connections.items() 
+                                        if term not in patterns})
+        for term, conn in patterns.items():
+            pin = self.cell.pins.get(term)
+            if pin is None:
+                raise ICStitchError(f"PIN '{term}' is not in the cell '{self.cell_name}'")
+            res[pin.full_name] = conn
+            self._display[pin.full_name] = conn
+        return res
+    
+    @staticmethod
+    def _is_pattern(conn:Connection) -> bool:
+        name = conn if isinstance(conn, str) else getattr(conn, "full_name", "")
+        return "{" in name
+
+    def _bind(self, parent:"_BaseCell"):
+        super()._bind(parent)
+        self._intern_net = parent.intern_net # Nets of the patterns are resolved per element
+    
+    def _resolve(self, conn:Union[str,Pin,Net], col:int, row:int) -> Net:
+        " Net of the element, a pattern is formatted and its net is created once "
+        if not self._is_pattern(conn):
+            return conn
+        template = conn if isinstance(conn, str) else conn.full_name
+        name = template.format(col=col, row=row)
+        net = self._resolved.get(name)
+        if net is None:
+            net = self._intern_net(Pin(name) if isinstance(conn, Pin) else name)
+            self._resolved[name] = net
+        return net
+    
+    def element_connections(self, col:int, row:int) -> Dict[str,Net]:
+        return {term: self._resolve(conn, col, row) for term, conn in self.connections.items()}
+    
+    def element_name(self, col:int, row:int) -> str:
+        return f"{self.instance_name}_{col}_{row}"
+    
+    def _connect_layout(self, parent_lay:CustomLayoutCell):
+        lay_instance = parent_lay.insert_array(self.instance_name, self.cell.layout, 
+                                               self.na, self.nb, self.a, self.b, self.trans)
+        # A net is aligned with its first element only, other elements sharing the net 
+        # are connected electrically
+        seen_nets = set()
+        for row in range(self.nb):
+            for col in range(self.na):
+                for term, cell_net in self.element_connections(col, row).items():
+                    net_name = cell_net._lay_name
+                    if net_name in seen_nets:
+                        continue
+                    seen_nets.add(net_name)
+                    if cell_net._layout is None: # Create a Layout Net
+                        ref_pin = lay_instance.terminal(term, col, row)
+                        cell_net._layout = parent_lay.add_net(net_name, ref_pin, lay_instance)
+                    if cell_net.pin and cell_net._layout.top_pin is None:
+                        parent_lay.add_pin(cell_net._layout, cell_net.pin._lay_name)
+                    lay_instance.connect_element(term, col, row, cell_net._layout)
+        self._lay_instance = lay_instance
+    
+    def _connect_netlist(self, parent_sch:CustomNetlistCell):
+        # No arrays in a netlist, each element is a subcircuit
+        ref_cell = parent_sch.add(self.cell.netlist)
+        for row in range(self.nb):
+            for col in range(self.na):
+                sub = parent_sch.kdb_circuit.create_subcircuit(ref_cell.kdb_circuit, self.element_name(col, row))
+                for term, cell_net in self.element_connections(col, row).items():
+                    if cell_net._netlist is None: # Create a Netlist Net
+                        cell_net._netlist = parent_sch.add_net(cell_net._sch_name)
+                    if cell_net.pin and cell_net.pin._sch_name not in parent_sch.pins:
+                        parent_sch.add_pin(cell_net._netlist, cell_net.pin._sch_name)
+                    sub.connect_pin(ref_cell.pins[term].kdb_pin, cell_net._netlist.kdb_net)
+    
+    def top_pins(self) -> List[Pin]:
+        pins = [net.pin for net in self._resolved.values() if net.pin is not None]
+        for conn in self.connections.values():
+            if not self._is_pattern(conn) and conn.pin is not None:
+                pins.append(conn.pin)
+        return pins
+    
     def __str__(self):
-        return f"{self.instance_name} ({self.cell_name}) {self.connections}"
+        return f"{self.instance_name} ({self.cell_name} {self.na}x{self.nb}) {self._display}"
 
 class _BaseCell():
-    def __init__(self, cell_name:str, layout: CustomLayoutCell, netlist: CustomNetlistCell):
+    def __init__(self, cell_name:str, layout: CustomLayoutCell, netlist: CustomNetlistCell,
+                 build_stats:Union[BuildStats,None] = None):
         self.name = cell_name
         self.layout = layout
         self.netlist = netlist
-        self._logger = logging.getLogger(cell_name)
-        addStreamHandler(self._logger, verbose=True)
-        self._logger.setLevel(logging.DEBUG)
-        self._logger.debug(f"Cell: {cell_name}")
+        # Phases of this cell only, see GlobalConfigs.COLLECT_STATS and total_stats()
+        self.stats = build_stats if build_stats is not None else BuildStats(cell_name)
+        self._logger = cell_logger(cell_name)
+        self._logger.debug("Cell: %s", cell_name)
         self.items:Dict[str, Item] = {}
         self.pins:Dict[str, Pin] = {}
         self.nets:Dict[str, Net] = {}
+        self._bus_pins = None # Pin count, brackets and buses of the last bus_pins() call
+
+    def bus_pins(self) -> Dict[str, List[str]]:
+        """ Pins of the buses, the base name -> pin names in the index order.
+            Recognized by GlobalConfigs.BUS_BRACKETS once, until pins are added
+        """
+        bus_l, bus_r = globconf.BUS_BRACKETS
+        key = (len(self.pins), bus_l, bus_r)
+        if self._bus_pins is not None and self._bus_pins[0] == key:
+            return self._bus_pins[1]
+        indexed:Dict[str, List[Tuple[int, str]]] = {}
+        for pin_name in self.pins:
+            if not pin_name.endswith(bus_r):
+                continue
+            base, bracket, index = pin_name[:-len(bus_r)].rpartition(bus_l)
+            index = index.strip()
+            if not bracket or not index.isdigit():
+                continue
+            indexed.setdefault(base, []).append((int(index), pin_name))
+        buses = {base: [name for _, name in sorted(bits)] for base, bits in indexed.items()}
+        self._bus_pins = (key, buses)
+        return buses
+
+    def intern_net(self, conn:Union[str,Pin,Net]) -> Net:
+        """ Net of this cell by name, every use of a name resolves to one Net object.
+            A Pin makes the net a top pin of the cell, the first Pin of a name is kept
+        """
+        if isinstance(conn, str):
+            name, pin = conn, None
+        elif isinstance(conn, (Pin, Net)):
+            name, pin = conn.full_name, conn if isinstance(conn, Pin) else conn.pin
+        else:
+            raise ICStitchError(f"Unexpected type of the net must be Pin, Net or str, given {type(conn)}")
+        net = self.nets.get(name)
+        if net is None:
+            net = conn if isinstance(conn, Net) else Net(name)
+            self.nets[net.full_name] = net
+        if pin is not None and net.pin is None:
+            net.pin = pin
+        return net
     
+    def total_stats(self) -> BuildStats:
+        " Stats of the cell and its subcells, a subcell used by many items is counted once "
+        res = BuildStats(self.name)
+        seen = set()
+        cells:List[_BaseCell] = [self]
+        while cells:
+            cell = cells.pop()
+            if id(cell) in seen:
+                continue
+            seen.add(id(cell))
+            res.merge(cell.stats)
+            cells.extend(item.cell for item in cell.items.values())
+        return res
+
     def claim(self, outpath:str = "./", layfile:str = "", schfile = ""):
         " Save all data in outpath with default name, or in layfile/schfile if present "
+        with self.stats.collect():
+            self._claim(outpath, layfile, schfile)
+
+    def _claim(self, outpath:str, layfile:str, schfile:str):
         out_path = Path(outpath)
         if self.layout:
             if layfile:
                 laypath = layfile
             else:
-                layfile_name = f"{self.name}.gds"
+                layfile_name = f"{self.name}{layout_suffix()}"
                 out_path.mkdir(parents=True, exist_ok=True)
                 laypath = out_path/layfile_name 
             self.layout.save(laypath)
@@ -112,30 +310,46 @@ class _BaseCell():
 class CustomCell(_BaseCell, ABC):
     def __init__(self, cell_name:str) -> None:
         super().__init__(cell_name, CustomLayoutCell(cell_name), CustomNetlistCell(cell_name))
+
+    @classmethod
+    def cached(cls, *args, **kwargs) -> Union["CustomCell", "LeafCell"]:
+        """ Build the cell, or restore it from GlobalConfigs.BUILD_CACHE_DIR if it's already built.
+            A restored cell can only be used as a subcell or claimed
+        """
+        from .build_cache import BUILD_CACHE # Imports this module
+        return BUILD_CACHE.get(cls, *args, **kwargs)
                 
     def __setitem__(self, instance_name:str, item:Item):
-        if(type(item) is not Item):
+        if(not isinstance(item, Item)):
             raise ICStitchError("Item must be an object of Item class")
         if(instance_name in self.items.keys()):
             raise ICStitchError(f"Item {instance_name} must have an unique name")
         if item.is_instantiated:
             raise ICStitchError(f"Item {instance_name} is already instantiated")
+        with self.stats.collect():
+            self._insert_item(instance_name, item)
+
+    @stats.timed("setitem", trace=False)
+    def _insert_item(self, instance_name:str, item:Item):
         item.instance_name = instance_name
-        self._logger.info(f"{item}")
+        item._bind(self)
+        self._logger.info("%s", item) # Formatted only if INFO is enabled, see quiet()
         if self.layout is not None:
             try:
-                self._logger.debug(f"Connecting Layout")
+                self._logger.debug("Connecting Layout")
                 item._connect_layout(self.layout)
             except LayoutError as exc:
                 raise ICStitchError(f"Failed to connect Layout.\n{exc}")
         if self.netlist is not None:
             try:
-                self._logger.debug(f"Connecting Netlist")
+                self._logger.debug("Connecting Netlist")
                 item._connect_netlist(self.netlist)
             except NetlisterError as exc:
                 raise ICStitchError(f"Failed to connect Netlist.\n{exc}")
         item.is_instantiated = True
         self.items[instance_name] = item
+        for pin in item.top_pins(): # Pins of this cell, to be used by parents
+            self.pins[pin.full_name] = pin
     
     def __getitem__(self, instance_name:str):
         return self.items[instance_name]
@@ -143,38 +357,56 @@ class CustomCell(_BaseCell, ABC):
     def find_pin(self, name:str):
         if(not isinstance(name, str)):
             raise ICStitchError("Incorrect type of the name, must be 'str'")
-        pin = Pin(name)
-        return pin
+        net = self.nets.get(name)
+        if net is not None and net.pin is not None:
+            return net.pin
+        return Pin(name)
     
     def find_net(self, name:str):
         if(not isinstance(name, str)):
             raise ICStitchError("Incorrect type of the name, must be 'str'")
-        net = Net(name, pin=True)
-        return net
+        return self.intern_net(name)
     
 class LeafCell(_BaseCell):
     _loaded:Dict[str, "LeafCell"] = {}
     def __new__(cls, cell_name, *arg, **kwargs):
         # Check if an object with the given name already exists
         if cell_name in cls._loaded:
-            # Reusing existing object
-            return cls._loaded[cell_name]
+            loaded = cls._loaded[cell_name]
+            # Reusing existing object, if leafcell files were not modified since
+            if loaded._stamp == LEAFCELLS.stamp(cell_name):
+                return loaded
         
         # Create a new instance if not found
         instance = super().__new__(cls)
+        instance._stamp = None
         cls._loaded[cell_name] = instance  # Store the instance in the dictionary
         return instance
     
     def __init__(self, cell_name, check_pins_mismatch = True):
-        super().__init__(cell_name, LayLeafCell(cell_name), LeafNetlistCell(cell_name))
-        self.pins = self._find_pins()
+        if self._stamp is not None: # Already loaded, see __new__
+            return None
+        build_stats = BuildStats(cell_name)
+        with build_stats.collect():
+            layout, netlist = LayLeafCell(cell_name), LeafNetlistCell(cell_name)
+        self._setup(cell_name, layout, netlist, check_pins_mismatch, build_stats)
+
+    def _setup(self, cell_name:str, layout:LayLeafCell, netlist:LeafNetlistCell, check_pins_mismatch = True,
+               build_stats:Union[BuildStats,None] = None):
+        " Initialize with already loaded layout and netlist, see preload() "
+        self._stamp = LEAFCELLS.stamp(cell_name)
+        super().__init__(cell_name, layout, netlist, build_stats)
+        with self.stats.collect():
+            self.pins = self._find_pins()
         if check_pins_mismatch:
             self._check_pins()
 
     def _find_pins(self):
         """ Find all pins from Layout and Netlist """
-        res = {}    
-        for pin_name, lay_pin in self.layout.pins.items():
+        res = {}
+        lay_pins = self.layout.pins if self.layout else {}
+        sch_pins = self.netlist.pins if self.netlist else {}
+        for pin_name, lay_pin in lay_pins.items():
             if pin_name in res:
                 pin = res[pin_name]
             else:
@@ -182,7 +414,7 @@ class LeafCell(_BaseCell):
                 res[pin_name] = pin
             pin._layout = lay_pin    
             
-        for pin_name, sch_pin in self.netlist.pins.items():
+        for pin_name, sch_pin in sch_pins.items():
             if pin_name in res:
                 pin = res[pin_name]
             else:
@@ -199,9 +431,8 @@ class LeafCell(_BaseCell):
         """ Check all pins on matching """
         from_lay = set([n for n,p in self.pins.items() if p._layout is not None])
         from_sch = set([n for n,p in self.pins.items() if p._netlist is not None])
-        all_pin_names = from_lay or from_sch
-        only_lay = all_pin_names ^ from_lay
-        only_sch = all_pin_names ^ from_sch
+        only_lay = from_lay - from_sch
+        only_sch = from_sch - from_lay
         mismatched = False
         if only_lay or only_sch:
             mismatched = True
@@ -0,0 +1,142 @@
+"""
+Building many variants of one CustomCell subclass in a process pool.
+Leafcells are loaded once in the main process, so forked workers share them copy-on-write.
+Results are returned in the order of the variants, whatever the number of workers.
+"""
+import os
+import time
+import logging
+import traceback
+import multiprocessing
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Type, Union
+
+from ic_stitcher.configurations import GlobalLayoutConfigs as layconf
+from ic_stitcher.configurations import GlobalSchematicConfigs as schconf
+from ic_stitcher.layout.floorplaner import layout_suffix, reset_shared_layout
+from ic_stitcher.schematic.netlister import reset_shared_netlist
+from ic_stitcher.custom.custom_cell import CustomCell, LeafCell
+from ic_stitcher.custom.preload import preload
+
+LOGGER = logging.getLogger(__name__)
+
+class VariantResult():
+    """ Outcome of one variant: output files, build time and an error, if the build failed """
+    def __init__(self, index:int, cell_name:str, params:Dict[str, Any]) -> None:
+        self.index = index
+        self.cell_name = cell_name
+        self.params = params
+        self.layout:Union[str,None] = None # Path of the GDS file
+        self.netlist:Union[str,None] = None # Path of the CDL file
+        self.build_time = 0.0 # Constructor of the cell, seconds
+        self.claim_time = 0.0 # Writing the files, seconds
+        self.error:Union[str,None] = None
+        self.traceback:Union[str,None] = None
+        self.pid = os.getpid()
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"index": self.index,
+                "cell_name": self.cell_name,
+                "params": {key: repr(value) for key, value in self.params.items()},
+                "layout": self.layout,
+                "netlist": self.netlist,
+                "build_time": self.build_time,
+                "claim_time": self.claim_time,
+                "error": self.error}
+
+    def __str__(self):
+        if self.error:
+            return f"{self.cell_name}: FAILED {self.error}"
+        return f"{self.cell_name}: {self.build_time + self.claim_time:.3f}s"
+
+    def __repr__(self):
+        return f"VARIANT[{self.index}]: {self}"
+
+# Task of a worker process, set by its initializer (the main process passes the task directly)
+_TASK:Dict[str, Any] = {}
+
+def _init_worker(task:Dict[str, Any]):
+    _TASK.update(task)
+    for name in task["leafcells"]: # Already loaded on fork, read on spawn
+        LeafCell(name)
+
+def _build(job) -> VariantResult:
+    return _build_variant(_TASK, job)
+
+def _build_variant(task:Dict[str, Any], job) -> VariantResult:
+    index, params = job
+    cell_class:Type[CustomCell] = task["cell_class"]
+    res = VariantResult(index, f"{cell_class.__name__}_{index}", params)
+    out_path = Path(task["outpath"])
+    timestamps = layconf.WRITE_TIMESTAMPS
+    try:
+        # Parameters named index or cls fail here, only this variant
+        cell_name = res.cell_name = task["name"].format(index=index, cls=cell_class.__name__, **params)
+        if layconf.SHARED_LAYOUT: # Variants must not share cells
+            reset_shared_layout()
+        if schconf.SHARED_NETLIST:
+            reset_shared_netlist()
+        start = time.perf_counter()
+        cell = cell_class(cell_name, **params)
+        res.build_time = time.perf_counter() - start
+        laypath = out_path/f"{cell_name}{layout_suffix()}" if cell.layout else None
+        schpath = out_path/f"{cell_name}.cdl" if cell.netlist else None
+        start = time.perf_counter()
+        layconf.WRITE_TIMESTAMPS = False # Same variants give the same files, in any worker
+        cell.claim(str(out_path), layfile=laypath or "", schfile=schpath or "")
+        res.claim_time = time.perf_counter() - start
+        res.layout = str(laypath) if laypath else None
+        res.netlist = str(schpath) if schpath else None
+    except (KeyboardInterrupt, SystemExit):
+        raise
+    except BaseException as exc: # ICStitchError and others are BaseException
+        res.error = f"{type(exc).__name__}: {exc}"
+        res.traceback = traceback.format_exc()
+    finally:
+        layconf.WRITE_TIMESTAMPS = timestamps
+    return res
+
+def generate(cell_class:Type[CustomCell],
+             variants:Iterable[Dict[str, Any]],
+             outpath:Union[Path,str] = "./",
+             processes:Union[int,None] = None,
+             leafcells:Iterable[str] = (),
+             name:str = "{cls}_{index}") -> Iterator[VariantResult]:
+    """Build variants of a CustomCell subclass in parallel and save them into outpath.
+
+    Args:
+        cell_class: CustomCell subclass, constructed as cell_class(cell_name, **params)
+        variants: parameters of each variant
+        outpath: directory for GDS and CDL files
+        processes: number of workers, os.cpu_count() if None, 1 builds in this process
+        leafcells: names of leafcells to be loaded once before the workers are started
+        name: format of the cell names, with index, cls and the parameters as fields.
+            Files are written without GDS timestamps, a rebuilt variant gives the same file
+
+    Yields:
+        VariantResult of each variant in the order of the variants.
+        A failed variant has an error and doesn't stop the others
+    """
+    jobs = list(enumerate(dict(params) for params in variants))
+    Path(outpath).mkdir(parents=True, exist_ok=True)
+    task = {"cell_class": cell_class,
+            "outpath": str(outpath),
+            "name": name,
+            "leafcells": list(leafcells)}
+    if processes is None:
+        processes = os.cpu_count() or 1
+    processes = min(processes, len(jobs))
+    preload(task["leafcells"]) # Before the fork, so the workers share the loaded cells
+    if processes <= 1:
+        for job in jobs:
+            yield _build_variant(task, job)
+        return None
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in methods else "spawn")
+    LOGGER.info(f"Building {len(jobs)} variants of {cell_class.__name__} in {processes} processes")
+    with context.Pool(processes, initializer=_init_worker, initargs=(task,)) as pool:
+        yield from pool.imap(_build, jobs)
@@ -0,0 +1,199 @@
+"""
+Loading leafcells before the build.
+Layout and netlist files are read concurrently, the loaded cells are stored in LeafCell._loaded,
+so LeafCell(name) in a CustomCell returns them without any I/O.
+"""
+import os
+import time
+import logging
+import multiprocessing
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Tuple, Union
+
+from ic_stitcher.configurations import LEAFCELLS
+from ic_stitcher.layout.floorplaner import LayLeafCell
+from ic_stitcher.layout.pin_cache import PinRow
+from ic_stitcher.schematic.netlister import LeafNetlistCell
+from ic_stitcher.custom.custom_cell import LeafCell, ICStitchError
+from ic_stitcher.utils.stats import BuildStats
+
+LOGGER = logging.getLogger(__name__)
+
+class LeafLoad():
+    """ Loading of one leafcell: files, their sizes and load times """
+    def __init__(self, name:str) -> None:
+        self.name = name
+        self.layout_path:Union[str,None] = None
+        self.netlist_path:Union[str,None] = None
+        self.layout_size = 0 # Bytes
+        self.netlist_size = 0
+        self.layout_time = 0.0 # Seconds, including the pin extraction
+        self.netlist_time = 0.0
+        self.error:Union[str,None] = None
+        self.cached = False # Was already loaded
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self.__dict__)
+
+    def __str__(self):
+        if self.error:
+            return f"{self.name}: {self.error}"
+        return (f"{self.name}: layout {self.layout_size}B {self.layout_time:.3f}s, "
+                f"netlist {self.netlist_size}B {self.netlist_time:.3f}s")
+
+    def __repr__(self):
+        return f"LEAF: {self}"
+
+class PreloadReport():
+    """ Result of preload(), problems are collected instead of raised """
+    def __init__(self) -> None:
+        self.leafs:Dict[str, LeafLoad] = {}
+        self.missing:List[str] = [] # No layout or no netlist file
+        self.mismatched:List[str] = [] # Layout and netlist pins differ
+        self.failed:List[str] = [] # Files can't be read
+        self.wall_time = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return not (self.missing or self.mismatched or self.failed)
+
+    @property
+    def total_time(self) -> float:
+        " Sum of the load times of all files, compare with wall_time "
+        return sum(leaf.layout_time + leaf.netlist_time for leaf in self.leafs.values())
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"wall_time": self.wall_time,
+                "total_time": self.total_time,
+                "missing": self.missing,
+                "mismatched": self.mismatched,
+                "failed": self.failed,
+                "leafs": [leaf.to_dict() for leaf in self.leafs.values()]}
+
+    def __str__(self):
+        lines = [str(leaf) for leaf in self.leafs.values()]
+        lines.append(f"{len(self.leafs)} leafcells in {self.wall_time:.3f}s "
+                     f"(sum of loads {self.total_time:.3f}s)")
+        return "\n".join(lines)
+
+def _read(leaf:LeafLoad, rows:Union[List[PinRow],None] = None
+          ) -> Tuple[LayLeafCell, LeafNetlistCell, BuildStats]:
+    " Read both files of a leafcell, runs in a worker thread "
+    build_stats = BuildStats(leaf.name)
+    with build_stats.collect():
+        start = time.perf_counter()
+        # Files are resolved by preload(), LEAFCELLS isn't accessed from the threads
+        layout = LayLeafCell(leaf.name, rows, path=Path(leaf.layout_path))
+        if rows is None:
+            leaf.layout_time = time.perf_counter() - start
+        start = time.perf_counter()
+        netlist = LeafNetlistCell(leaf.name, path=Path(leaf.netlist_path))
+        leaf.netlist_time = time.perf_counter() - start
+    return layout, netlist, build_stats
+
+def _extract_pins(name:str, path:str) -> Tuple[Union[List[PinRow],None], float, Union[str,None]]:
+    " Read a layout and extract its pins, runs in a worker process "
+    start = time.perf_counter()
+    try:
+        rows = [pin.to_row() for pin in LayLeafCell(name, path=Path(path)).pins.values()]
+    except (KeyboardInterrupt, SystemExit):
+        raise
+    except BaseException as exc: # Pool workers don't survive BaseException
+        return None, 0.0, f"{type(exc).__name__}: {exc}"
+    return rows, time.perf_counter() - start, None
+
+def preload(names:Union[Iterable[str], str] = "all",
+            workers:Union[int,None] = None,
+            processes:bool = False,
+            check_pins_mismatch:bool = True,
+            strict:bool = False) -> PreloadReport:
+    """Load leafcells concurrently before the build.
+
+    Args:
+        names: leafcell names or "all" for every leafcell in LEAFCELL_PATH
+        workers: number of threads (or processes), default of ThreadPoolExecutor if None
+        processes: read layouts and extract their pins in forked processes.
+            KLayout keeps the GIL while reading, so threads overlap only the Python part;
+            the geometry of leafcells loaded this way is read on the first access
+        check_pins_mismatch: check layout and netlist pins, like LeafCell()
+        strict: raise ICStitchError with all problems, instead of only reporting them
+
+    Returns:
+        PreloadReport with the load time and size of each file and the problems found
+    """
+    start = time.perf_counter()
+    report = PreloadReport()
+    if names == "all":
+        names = sorted(set(LEAFCELLS.layout_names()) | set(LEAFCELLS.netlist_names()))
+    to_read:List[LeafLoad] = []
+    for name in dict.fromkeys(names): # Unique, in the given order
+        leaf = LeafLoad(name)
+        report.leafs[name] = leaf
+        # Files are resolved here, the threads and processes read the given paths
+        lay_entry = LEAFCELLS.layout_entry(name)
+        sch_entry = LEAFCELLS.netlist_entry(name)
+        if lay_entry:
+            leaf.layout_path = str(lay_entry.path)
+            leaf.layout_size = os.stat(lay_entry.path).st_size
+        if sch_entry:
+            leaf.netlist_path = str(sch_entry.path)
+            leaf.netlist_size = os.stat(sch_entry.path).st_size
+        if not lay_entry or not sch_entry:
+            kind = "layout" if not lay_entry else "netlist"
+            leaf.error = f"no {kind} file in LEAFCELL_PATH"
+            report.missing.append(name)
+            continue
+        loaded = LeafCell._loaded.get(name)
+        if loaded is not None and loaded._stamp == LEAFCELLS.stamp(name):
+            leaf.cached = True
+            continue
+        to_read.append(leaf)
+
+    pin_rows:Dict[str, List[PinRow]] = {}
+    if processes and to_read and "fork" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("fork") # Workers inherit the configurations
+        with context.Pool(workers) as pool:
+            results = pool.starmap(_extract_pins, [(leaf.name, leaf.layout_path) for leaf in to_read],
+                                   chunksize=1)
+        for leaf, (rows, seconds, error) in zip(list(to_read), results):
+            leaf.layout_time = seconds
+            if error is not None:
+                leaf.error = error
+                report.failed.append(leaf.name)
+                to_read.remove(leaf)
+                continue
+            pin_rows[leaf.name] = rows
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [(leaf, pool.submit(_read, leaf, pin_rows.get(leaf.name))) for leaf in to_read]
+        for leaf, future in futures:
+            try:
+                layout, netlist, build_stats = future.result()
+            except (KeyboardInterrupt, SystemExit):
+                raise
+            except BaseException as exc: # LayoutError and NetlisterError are BaseException
+                leaf.error = f"{type(exc).__name__}: {exc}"
+                report.failed.append(leaf.name)
+                continue
+            cell = LeafCell.__new__(LeafCell, leaf.name)
+            try:
+                cell._setup(leaf.name, layout, netlist, check_pins_mismatch, build_stats)
+            except ICStitchError as exc:
+                LeafCell._loaded.pop(leaf.name, None) # Don't keep a half-initialized cell
+                leaf.error = str(exc).strip().replace("\n", "; ")
+                report.mismatched.append(leaf.name)
+    report.wall_time = time.perf_counter() - start
+
+    for name in report.missing + report.failed + report.mismatched:
+        LOGGER.error(f"Leafcell {report.leafs[name]}")
+    LOGGER.info(f"Preloaded {len(report.leafs)} leafcells in {report.wall_time:.3f}s")
+    if strict and not report.ok:
+        problems = "\n".join(str(report.leafs[name])
+                             for name in report.missing + report.failed + report.mismatched)
+        raise ICStitchError(f"Leafcells can't be loaded:\n{problems}")
+    return report
@@ -7,43 +7,81 @@ use 'sys.path.append(<path_to_python_lib_with_stitcher>)' to achieve this
 !!! Not usable outside the Klayout !!!
 """
 # import flayout # A lot of function are taken from it, quite helpfull
+from collections import OrderedDict
 from inspect import Parameter, signature, Signature
-from typing import Callable, Optional, Type
+from typing import Any, Callable, Dict, Optional, Tuple, Type
 
 from ic_stitcher.configurations import kdb
 from ic_stitcher import CustomCell
 
 # PCell class that creates the PCell from a class defenition
+# Use pcell_factory(), param() adds the parameter accessors to the class, so each CustomCell
+# subclass has its own factory class
 class PCellFactory(kdb.PCellDeclarationHelper):
-    def __init__(self, subclass:Type[CustomCell]) -> None:
-        """Create a PCell from a subclass of a CustomCell class."""
+    # Number of built cells kept by each factory, repeated parameter sets are only copied
+    CACHE_SIZE = 32
+    subclass:Optional[Type[CustomCell]] = None # Set on the factory class of the subclass
+    def __init__(self, cache_size:int = None) -> None:
+        """Create a PCell from the subclass of a CustomCell class."""
+        subclass = self.subclass
+        if subclass is None:
+            raise TypeError("PCellFactory has no CustomCell subclass, use pcell_factory(subclass)")
         super().__init__()
-        self.subclass = subclass
+        self.cache_size = self.CACHE_SIZE if cache_size is None else cache_size
+        self._built:"OrderedDict[Tuple, CustomCell]" = OrderedDict() # LRU, the last one is the newest
+        self.hits = 0
+        self.misses = 0
         # Getting a signiture of __init__
         self.init_sig = self._extract_sig(subclass.__init__) or {}
         self.func_name = subclass.__name__
         params = self._pcell_parameters(self.init_sig, on_error="raise")
         self._param_keys = list(params.keys())
-        self._param_values = []
         for name, param in params.items():
             # Add the parameter to the PCell
-            self._param_values.append(
-                self.param(
-                    name=name,
-                    value_type=_klayout_type(param),
-                    description=name.replace("_", " "),
-                    default=param.default,
-                )
+            self.param(
+                name=name,
+                value_type=_klayout_type(param),
+                description=name.replace("_", " "),
+                default=param.default,
             )
 
     def produce_impl(self):
         """Produce the PCell."""
-        params = dict(zip(self._param_keys, self._param_values))
-        subclass_obj = self.subclass(**params)
+        # Values of the produced variant, they're accessible as attributes while it's produced
+        params = {name: getattr(self, name) for name in self._param_keys}
+        cell_name = params.pop("cell_name", None) # Only the produced cell is renamed
+        subclass_obj = self._build(params)
         # Add the cell to the layout
         internal_cell:kdb.Cell = self.cell # Typing hook
         internal_cell.copy_tree(subclass_obj.layout.kdb_cell)
-        internal_cell.name = params[subclass_obj.name]
+        internal_cell.name = cell_name or subclass_obj.name
+
+    def _build(self, params:Dict[str, Any]) -> CustomCell:
+        """ Built cell of the parameters, taken from the LRU cache if possible """
+        key = tuple((name, _normalize(value)) for name, value in params.items())
+        subclass_obj = self._built.get(key)
+        if subclass_obj is not None:
+            self.hits += 1
+            self._built.move_to_end(key)
+            return subclass_obj
+        self.misses += 1
+        subclass_obj = self.subclass(**params)
+        subclass_obj.layout.place()
+        subclass_obj.layout.annotate()
+        if self.cache_size > 0:
+            self._built[key] = subclass_obj
+            while len(self._built) > self.cache_size:
+                self._built.popitem(last=False)
+        return subclass_obj
+
+    def cache_info(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses,
+                "size": len(self._built), "max_size": self.cache_size}
+
+    def cache_clear(self):
+        self._built.clear()
+        self.hits = 0
+        self.misses = 0
 
     def _pcell_parameters(self, sig: Signature, on_error="ignore"):
         """Get the parameters of a function."""
@@ -84,6 +122,29 @@ class PCellFactory(kdb.PCellDeclarationHelper):
         ) or {}
         return sig_new
 
+def _normalize(value:Any):
+    """ Hashable form of a PCell parameter value """
+    if isinstance(value, (list, tuple)):
+        return tuple(_normalize(item) for item in value)
+    if isinstance(value, kdb.LayerInfo):
+        return ("LayerInfo", value.to_s())
+    if isinstance(value, kdb.Shape):
+        return ("Shape", value.to_s())
+    try:
+        hash(value)
+    except TypeError:
+        return repr(value)
+    return value
+
+_FACTORY_CLASSES:Dict[Type[CustomCell], Type[PCellFactory]] = {}
+def pcell_factory(subclass:Type[CustomCell], cache_size:int = None) -> PCellFactory:
+    """ PCell declaration of a subclass of a CustomCell class, its factory class is created once """
+    factory_class = _FACTORY_CLASSES.get(subclass)
+    if factory_class is None:
+        factory_class = type(f"{subclass.__name__}PCellFactory", (PCellFactory,), {"subclass": subclass})
+        _FACTORY_CLASSES[subclass] = factory_class
+    return factory_class(cache_size)
+
 def all_subclasses(cls):
     return set(cls.__subclasses__()).union(
         [s for c in cls.__subclasses__() for s in all_subclasses(c)])
@@ -94,7 +155,7 @@ def register_pcell_lib(libname:str, description:str = "IC-stitcher based library
     if not subclasses:
         subclasses:set[Type[CustomCell]] = all_subclasses(CustomCell)
     for subcls in subclasses:
-        MYLIB.layout().register_pcell(subcls.__name__, PCellFactory(subcls))
+        MYLIB.layout().register_pcell(subcls.__name__, pcell_factory(subcls))
     MYLIB.register(libname)
     
 # Klayout PCell type -> Python type Mapper
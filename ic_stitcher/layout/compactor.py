@@ -0,0 +1,135 @@
+"""
+Pre-save optimization of a layout tree, see GlobalLayoutConfigs.COMPACT_ON_SAVE.
+Cells, which are not reachable from the top cell, are removed and geometrically identical copies
+of a cell (uniquified names of the same base name: "cell", "cell$1", "cell$2") are merged into one,
+the references to the removed copies are rewritten. Identical cells of different names are kept,
+the layout cells must match the subcircuits of the netlist.
+"""
+import logging
+from typing import Dict, List, Tuple, Union
+
+from ..configurations import kdb
+
+LOGGER = logging.getLogger(__name__)
+
+class CompactReport():
+    """ Cells removed by compact(), bytes are measured only on request """
+    def __init__(self) -> None:
+        self.pruned:List[str] = [] # Orphan cells
+        self.merged:Dict[str, str] = {} # Removed duplicate -> the cell, it's replaced by
+        self.merged_indices:Dict[int, int] = {}
+        self.bytes_before:Union[int,None] = None
+        self.bytes_after:Union[int,None] = None
+
+    @property
+    def cells_saved(self) -> int:
+        return len(self.pruned) + len(self.merged)
+
+    @property
+    def bytes_saved(self) -> Union[int,None]:
+        if self.bytes_before is None or self.bytes_after is None:
+            return None
+        return self.bytes_before - self.bytes_after
+
+    def to_dict(self):
+        return {"pruned": self.pruned,
+                "merged": self.merged,
+                "cells_saved": self.cells_saved,
+                "bytes_before": self.bytes_before,
+                "bytes_after": self.bytes_after,
+                "bytes_saved": self.bytes_saved}
+
+    def __str__(self):
+        res = f"{len(self.pruned)} orphan and {len(self.merged)} duplicate cells removed"
+        if self.bytes_saved is not None:
+            res += f", {self.bytes_saved} bytes saved ({self.bytes_before} -> {self.bytes_after})"
+        return res
+
+    def __repr__(self):
+        return f"COMPACT: {self}"
+
+def _content(layout:kdb.Layout, cell:kdb.Cell) -> List[Tuple[str, List[str]]]:
+    """ Shapes per layer and instances of the cell as sorted strings, the cell name is not included.
+        Instances refer to the cell indices, so children must be merged first
+    """
+    res = []
+    for layer_indx in layout.layer_indexes():
+        shapes = cell.shapes(layer_indx)
+        if shapes.is_empty():
+            continue
+        items = sorted(f"{shape.to_s()}#{shape.prop_id}" for shape in shapes.each())
+        res.append((layout.get_info(layer_indx).to_s(), items))
+    insts = sorted(f"{inst.cell_inst.to_s()}#{inst.prop_id}" for inst in cell.each_inst())
+    res.append(("", insts))
+    return res
+
+def _base_name(name:str) -> str:
+    " Name without the uniquifying suffix: cell$1 -> cell "
+    base, sep, suffix = name.rpartition("$")
+    return base if sep and base and suffix.isdigit() else name
+
+def _signature(content:List[Tuple[str, List[str]]]) -> int:
+    return hash(tuple((layer, len(items), hash(tuple(items))) for layer, items in content))
+
+def _measure(layout:kdb.Layout, top_cell:kdb.Cell,
+             options:Union[kdb.SaveLayoutOptions,None]) -> Union[int,None]:
+    if not hasattr(layout, "write_bytes"): # Older KLayout
+        return None
+    opt = options.dup() if options is not None else kdb.SaveLayoutOptions()
+    opt.select_cell(top_cell.cell_index())
+    return len(layout.write_bytes(opt))
+
+def compact(layout:kdb.Layout, top_cell:kdb.Cell,
+            prune:bool = True, merge:bool = True, measure:bool = False,
+            options:Union[kdb.SaveLayoutOptions,None] = None) -> CompactReport:
+    """Remove orphan cells and merge identical cells of the top_cell tree.
+
+    Args:
+        layout: layout of the top cell, it's modified in place
+        top_cell: cell to be saved, it's never merged into another cell
+        prune: remove cells not reachable from the top cell (only for a layout of one tree)
+        merge: merge geometrically identical copies of a cell, see _base_name()
+        measure: write the tree into memory before and after, to report the bytes saved
+        options: save options for the measure, GDS2 by default
+    """
+    report = CompactReport()
+    if measure:
+        report.bytes_before = _measure(layout, top_cell, options)
+    top_index = top_cell.cell_index()
+    called = set(top_cell.called_cells())
+    if prune:
+        orphans = [cell for cell in layout.each_cell() if cell.cell_index() != top_index
+                   and cell.cell_index() not in called]
+        report.pruned = [cell.name for cell in orphans]
+        if orphans:
+            layout.delete_cells([cell.cell_index() for cell in orphans])
+    if merge:
+        groups:Dict[Tuple[str, int], List[Tuple[int, List[Tuple[str, List[str]]]]]] = {}
+        for index in list(layout.each_cell_bottom_up()):
+            if index not in called: # The top cell and other trees are kept
+                continue
+            cell = layout.cell(index)
+            content = _content(layout, cell)
+            candidates = groups.setdefault((_base_name(cell.name), _signature(content)), [])
+            kept = next((kept for kept, kept_content in candidates if kept_content == content), None)
+            if kept is None:
+                candidates.append((index, content))
+                continue
+            kept_cell = layout.cell(kept)
+            for parent_inst in list(cell.each_parent_inst()):
+                parent_inst.child_inst().cell_index = kept
+            name = cell.name
+            report.merged_indices[index] = kept
+            layout.delete_cell(index)
+            removed_name = name
+            # Prefer the name without a uniquifying suffix ("cell$1") for the merged cell
+            if "$" in kept_cell.name and "$" not in name:
+                removed_name = kept_cell.name
+                for dup, kept_name in report.merged.items():
+                    if kept_name == removed_name:
+                        report.merged[dup] = name
+                kept_cell.name = name
+            report.merged[removed_name] = kept_cell.name
+    if measure:
+        report.bytes_after = _measure(layout, top_cell, options)
+    return report
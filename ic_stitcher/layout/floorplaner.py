@@ -1,16 +1,22 @@
 #from __future__ import annotations
-from typing import Dict, List
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple, Union
 import logging
 #from dataclasses import dataclass
 
-from ..configurations import _GET_LEAFCELL, Layer, kdb
+from ..configurations import LEAFCELLS, Layer, kdb
 from ..configurations import GlobalLayoutConfigs as config
 from ..configurations import GlobalConfigs as globconf
-from ..utils.Logging import addStreamHandler
+from ..utils.Logging import package_logger
+from ..utils import stats
+from .pin_cache import PIN_CACHE, PinRow
+from .placer import Placer, PlacementConflict
+from .pin_table import PinTable, TerminalMap
+from .compactor import CompactReport, compact
 
 LOGGER = logging.getLogger(__name__)
-LOGGER.setLevel(logging.DEBUG)
-addStreamHandler(LOGGER, verbose=config.VERBOSE)
+package_logger() # The handler of all ic_stitcher loggers, see set_log_level()
 
 R0 = kdb.Trans(0 , False, 0, 0)
 R90 = kdb.Trans(3 , False, 0, 0)
@@ -21,6 +27,9 @@ M90 = kdb.Trans(3 , True, 0, 0)
 M180 = kdb.Trans(2, True, 0, 0)
 M270 = kdb.Trans(1, True, 0, 0)
 
+# Grid tiles a pin box can be hashed into, bigger boxes (power straps, pads) are checked directly
+_MAX_LABEL_TILES = 64
+
 class LayoutError(BaseException): pass
 
 #@dataclass
@@ -28,11 +37,13 @@ class LayoutProblems():
     description:str
     values:List[kdb.Box]
 
-def _load_leafcell(cell_name:str) -> kdb.Layout:
+@stats.timed("layout_read")
+def _load_leafcell(cell_name:str, path:Union[Path,None] = None) -> kdb.Layout:
     """
-    Read a cell from GDS leafcells
+    Read a cell from GDS leafcells, or from the given file
     """
-    path = _GET_LEAFCELL(cell_name, config.LEAFCELL_PATH)
+    if path is None:
+        path = LEAFCELLS.layout(cell_name)
     if(path is None):
         raise LayoutError(f"'{cell_name}' not found in your 'LEAFCELL_PATH'")
     layout = kdb.Layout(False)
@@ -56,12 +67,13 @@ class LayPinInfo():
         return str(self)
 
 class LayPin(): # Virtual Pin
+    __slots__ = ("box", "name", "text", "label_layer", "box_layer")
     def __init__(self, box:kdb.Box, 
                  box_layer:Layer,
                  label: kdb.Text,
                  label_layer:Layer) -> None:
         self.box:kdb.Box = box
-        self.name = label.string
+        self.name = sys.intern(label.string)
         self.text:kdb.Text = label
         
         self.label_layer = label_layer
@@ -70,6 +82,21 @@ class LayPin(): # Virtual Pin
     def copy(self):
         return LayPin(self.box.dup(), self.box_layer,
                       self.text.dup(), self.label_layer)
+
+    def to_row(self) -> PinRow:
+        " Plain representation, used to store pins in the cache "
+        return (self.name, self.box.to_s(),
+                (self.box_layer.layer, self.box_layer.datatype, self.box_layer.name),
+                self.text.trans.to_s(), self.text.size,
+                (self.label_layer.layer, self.label_layer.datatype, self.label_layer.name))
+
+    @classmethod
+    def from_row(cls, row:PinRow) -> "LayPin":
+        name, box, box_layer, text_trans, text_size, label_layer = row
+        text = kdb.Text(name, kdb.Trans.from_s(text_trans))
+        text.size = text_size
+        return cls(kdb.Box.from_s(box), Layer(*box_layer),
+                   text, Layer(*label_layer))
     
     def _transform_box(self,trans: kdb.Trans):
         self.box = self.box.transformed(trans)
@@ -105,56 +132,43 @@ class LayPin(): # Virtual Pin
     def __repr__(self):
         return str(self)
 
-class PlacedPin(LayPin): # Shape-based, to be able to move
-    def __init__(self, box_shape:kdb.Shape, text_shape:kdb.Shape, 
-                 adjust_label=False):
-        box_layer = Layer(box_shape.layer_info.layer, box_shape.layer_info.datatype,
-                          box_shape.layer_info.name)
-        label_layer = Layer(text_shape.layer_info.layer, text_shape.layer_info.datatype,
-                          text_shape.layer_info.name)
-        super().__init__(box_shape.box, box_layer, text_shape.text, label_layer)
-        self.box_shape = box_shape
-        self.text_shape = text_shape
-        self.cell = box_shape.cell
-        if(adjust_label):
-            self.center_label()
-            pass
-    
-    def center_label(self):
-        box_center = self.box.center()
-        rot = R0.rot - self.text.trans.rot
-        #self.text_shape.transform(kdb.Trans(rot)) # Rotate first to 0 - trans.rot
-        self.text_shape.transform(kdb.Trans(rot, False, 0, 0)) # Rotate first to 0 - trans.rot
-        self.text = self.text_shape.text
-        text_point = self.text.position()
-        displ = box_center - text_point
-        self.text_shape.transform(kdb.Trans(displ)) # Then displacment
-        self.text = self.text_shape.text
-
-    def _transform_box(self, trans: kdb.Trans):
-        self.box_shape.transform(kdb.Trans(trans.disp))
-        self.box = self.box_shape.box
-
-    def _transform_text(self, trans: kdb.Trans):
-        self.text_shape.transform(kdb.Trans(trans.disp)) # Then other
-        self.text = self.text_shape.text
-        
+class PlacedPin(LayPin): # Top-level pin of a custom cell
+    """ Follows the reference pin of its net, no shapes are edited on moves.
+        Box and label shapes are inserted by CustomLayoutCell.annotate()
+    """
+    __slots__ = ("ref_pin",)
+    def __init__(self, name:str, ref_pin:LayPin) -> None:
+        self.name = name
+        self.ref_pin = ref_pin
+        self.box_layer = ref_pin.box_layer
+        self.label_layer = ref_pin.label_layer
+
+    @property
+    def box(self) -> kdb.Box:
+        return self.ref_pin.box
+
+    @property
+    def text(self) -> kdb.Text:
+        " Label in the center of the box, not rotated "
+        text = self.ref_pin.text.dup()
+        text.string = self.name
+        text = text.transformed(kdb.Trans(R0.rot - text.trans.rot, False, 0, 0))
+        return text.transformed(kdb.Trans(self.box.center() - text.position()))
+
+    def transform(self, trans: kdb.Trans):
+        raise LayoutError(f"Top pin {self.name} follows its reference pin and can't be moved")
+
     def copy(self):
-        return PlacedPin(self.box_shape.dup(), self.text_shape.dup(), adjust_label=True)
+        return LayPin(self.box.dup(), self.box_layer,
+                      self.text, self.label_layer)
 
 class LayNet():
-    def __init__(self, name:str, ref_pin:LayPin) -> None:
+    __slots__ = ("name", "top_pin", "ref_pin", "ref_instance")
+    def __init__(self, name:str, ref_pin:LayPin, ref_instance:"CustomInstance" = None) -> None:
         self.name = name
         self.top_pin:PlacedPin = None
         self.ref_pin:LayPin = ref_pin
-
-    def readjust_pin(self):
-        if(not self.top_pin):
-            return None
-        if(not self.ref_pin):
-            return None
-        #displ = self.ref_pin.distance(self.top_pin)
-        self.top_pin.move_to(self.ref_pin)
+        self.ref_instance = ref_instance # Owner of the ref_pin
 
     def __str__(self):
         return f"LNET:{self.name}"
@@ -163,6 +177,8 @@ class LayNet():
         return f"{self} [{self.top_pin} {self.ref_pin}]"
 
 class CustomInstance():
+    __slots__ = ("ref_cell", "parent", "kdb_inst", "trans", "movement", "name",
+                 "ref_pins", "terminals", "nets", "is_pinned")
     def __init__(self, name:str, 
                  ref_cell: "CustomLayoutCell",
                  parent: "CustomLayoutCell",
@@ -176,66 +192,59 @@ class CustomInstance():
         #self.lable_name = f"{name} ({self.kdb_inst.to_s()})"
         self.ref_pins = ref_cell.pins
         
-        self.terminals = self.get_terminals(ref_cell.pins)
+        self.terminals = self.get_terminals(ref_cell.pin_table)
         self.nets:Dict[str, LayNet] = {}
         self.is_pinned = False
-        self.label:kdb.Shape = None
 
-    def add_label(self):
-        if config.INSTANCE_LABEL_LAYER is None:
-            return None
-        if self.label:
-            self.label.delete()
-        # Adding top-level label
-        lable_name = f"{self.name}"
-        lbl_text = kdb.Text(lable_name, self._center())
-        layer_indx = self.kdb_inst.layout().layer(config.INSTANCE_LABEL_LAYER)
-        lbl_shapes = self.parent.kdb_cell.shapes(layer_indx)
-        self.label = lbl_shapes.insert(lbl_text)
-
-    def get_terminals(self, pins:Dict[str,LayPin]) -> Dict[str,LayPin]:
-        res = {}
-        for pin_name, pin_obj in pins.items():
-            terminal = pin_obj.copy()
-            terminal.transform(self.trans)
-            res[pin_name] = terminal
-        return res
+    def label(self, cell_boxes:Dict[int, kdb.Box]) -> kdb.Text:
+        " Instance name in the center of the instance, cell_boxes caches bboxes of the cells "
+        center = self.bbox(cell_boxes).center()
+        return kdb.Text(self.name, kdb.Trans(center.x, center.y))
+
+    def get_terminals(self, table:PinTable) -> TerminalMap:
+        """ Terminals are the pin table of the cell, transformed by the instance,
+            LayPin objects are created on demand
+        """
+        return TerminalMap(table, self.trans, LayPin)
     
-    def _center(self) -> kdb.Trans:
-        boundary = self.kdb_inst.bbox()
-        center = boundary.center()
-        return kdb.Trans(center.x, center.y)
+    def bbox(self, cell_boxes:Dict[int, kdb.Box]) -> kdb.Box:
+        cell_index = self.kdb_inst.cell_index
+        if cell_index not in cell_boxes:
+            cell_boxes[cell_index] = self.kdb_inst.cell.bbox()
+        return cell_boxes[cell_index].transformed(self.kdb_inst.trans)
 
     def connect(self, terminal_name:str, net:LayNet):
         terminal = self.terminals[terminal_name]
         self.nets[terminal_name] = net
         # if(net.top_pin):
         #     self.terminals[terminal.name] = net.top_pin
-        self.move(net.ref_pin.distance(terminal))
+        self._align(terminal_name, terminal, net)
+
+    def _align(self, terminal_name:str, terminal:LayPin, net:LayNet):
+        " Move the terminal to the net, or record the constraint in the deferred placement "
+        placer = self.parent.placer
+        if placer is None:
+            self.move(net.ref_pin.distance(terminal))
+            return None
+        placer.constrain(self, terminal_name, (terminal.box.left, terminal.box.bottom),
+                         net.ref_instance, (net.ref_pin.box.left, net.ref_pin.box.bottom), net.name)
 
+    @stats.timed("move", trace=False)
     def move(self, displ: kdb.Vector):
         if displ == kdb.Vector():
             return None
         if(self.is_pinned):
-            LOGGER.warning(f"Trying to move already pinned instance {self.name}")
+            LOGGER.warning("Trying to move already pinned instance %s", self.name)
             #return None
+        stats.count("moves")
         trans = kdb.Trans(displ)
         self.kdb_inst.transform(trans)
-        for term in self.terminals.values():
-            term_name = term.name
-            term.transform(trans)
-            if term_name in self.nets:
-                net = self.nets[term_name]
-                net.readjust_pin()
-        self.add_label()
+        self.terminals.transform(trans)
+        self.parent.pins_moved() # Top pins follow the terminals
         self.is_pinned = True
         
     def update(self):
-        for term_name, net in self.nets.items():
-            terminal = self.terminals[term_name]
-            # if not terminal.xor(net.ref_pin):
-            #     LOGGER.error(f"PIN doesn't match on {net}: {terminal}<->{net.ref_pin}")
-            net.readjust_pin()
+        self.parent.pins_moved()
 
     def pin_to(self, pin1: LayPin, pin2:LayPin):
         displacement = pin2.distance(pin1) # From pin2 (destination) to pin1 (source)
@@ -249,16 +258,103 @@ class CustomInstance():
     def __repr__(self):
         return f"INST: {self} [{self.terminals}]"
 
+class CustomArrayInstance(CustomInstance):
+    """ Regular array of a cell, placed as one kdb.CellInstArray.
+        Element (col, row) is displaced by a*col + b*row, terminals of the elements
+        other than (0, 0) are created on demand only
+    """
+    __slots__ = ("na", "nb", "a", "b", "element_terminals", "element_nets")
+    def __init__(self, name:str, 
+                 ref_cell: "CustomLayoutCell",
+                 parent: "CustomLayoutCell",
+                 kdb_inst:kdb.Instance,
+                 na:int, nb:int,
+                 a:kdb.Vector, b:kdb.Vector) -> None:
+        super().__init__(name, ref_cell, parent, kdb_inst)
+        self.na = na
+        self.nb = nb
+        self.a = a
+        self.b = b
+        self.element_terminals:Dict[Tuple[str,int,int], LayPin] = {}
+        self.element_nets:Dict[Tuple[str,int,int], LayNet] = {}
+
+    def bbox(self, cell_boxes:Dict[int, kdb.Box]) -> kdb.Box:
+        box = super().bbox(cell_boxes)
+        last = self.a * (self.na - 1) + self.b * (self.nb - 1)
+        return box + box.moved(last) + box.moved(self.a * (self.na - 1)) + box.moved(self.b * (self.nb - 1))
+
+    def terminal(self, terminal_name:str, col:int, row:int) -> LayPin:
+        if col == 0 and row == 0:
+            return self.terminals[terminal_name]
+        key = (terminal_name, col, row)
+        if key not in self.element_terminals:
+            terminal = self.terminals[terminal_name].copy()
+            terminal.transform(kdb.Trans(self.a * col + self.b * row))
+            self.element_terminals[key] = terminal
+        return self.element_terminals[key]
+
+    def connect_element(self, terminal_name:str, col:int, row:int, net:LayNet):
+        if col == 0 and row == 0:
+            return self.connect(terminal_name, net)
+        terminal = self.terminal(terminal_name, col, row)
+        self.element_nets[(terminal_name, col, row)] = net
+        self._align(f"{terminal_name}({col},{row})", terminal, net)
+
+    def move(self, displ: kdb.Vector):
+        if displ == kdb.Vector():
+            return None
+        super().move(displ)
+        trans = kdb.Trans(displ)
+        for terminal in self.element_terminals.values():
+            terminal.transform(trans)
+
 class KDBCell():
-    def __init__(self, kdb_cell:kdb.Cell):
+    placer:Union[Placer,None] = None # Deferred placement of the instances, see CustomLayoutCell
+    def __init__(self, kdb_cell:kdb.Cell, pins:Dict[str, LayPin] = None):
         self.name = kdb_cell.name
         self.kdb_layout = kdb_cell.layout()
         self.kdb_cell = kdb_cell
         self.nets: Dict[str, LayNet] = {} # store new internal nets
         self.is_empty = self.kdb_cell.is_ghost_cell()
-        self.pins:Dict[str, LayPin] = self._get_pins()
-        self.cells:Dict[str,KDBCell] = self._map_cells()
-        self.instances:Dict[str,CustomInstance] = self._map_instances()
+        # Hierarchy is mapped on the first access only, see properties below
+        self._pins:Dict[str, LayPin] = pins
+        self._pin_table:Union[PinTable,None] = None
+        self._cells:Dict[str,KDBCell] = None
+        self._instances:Dict[str,CustomInstance] = None
+    
+    @property
+    def pins(self) -> Dict[str, LayPin]:
+        if self._pins is None:
+            self._pins = self._get_pins()
+        return self._pins
+    
+    @pins.setter
+    def pins(self, pins:Dict[str, LayPin]):
+        self._pins = pins
+        self._pin_table = None
+    
+    @property
+    def pin_table(self) -> PinTable:
+        " Columnar copy of the pins, used by the instances of this cell "
+        if self._pin_table is None:
+            self._pin_table = PinTable(self.pins)
+        return self._pin_table
+    
+    def pins_moved(self):
+        " Pins were added or moved, the pin table has to be rebuilt "
+        self._pin_table = None
+    
+    @property
+    def cells(self) -> Dict[str,"KDBCell"]:
+        if self._cells is None:
+            self._cells = self._map_cells()
+        return self._cells
+    
+    @property
+    def instances(self) -> Dict[str,"CustomInstance"]:
+        if self._instances is None:
+            self._instances = self._map_instances()
+        return self._instances
     
     def _map_cells(self) -> Dict[str,"KDBCell"]:
         res:Dict[str,KDBCell] = dict()
@@ -284,21 +380,65 @@ class KDBCell():
             res[instance.name] = instance 
         return res
     
-    def _find_label(self, layer:int, box: kdb.Box) -> kdb.Shape:
+    def _find_labels(self, layer:int, boxes:List[kdb.Box]) -> List[Union[kdb.Text,None]]:
         """
-        Find a label of a layer within a box, it's used to find pins
+        Find a label of a layer within each box, it's used to find pins.
+        Boxes are hashed into a grid of the typical box size, then all labels are collected
+        in one pass and each label checks only the boxes of its own grid tile.
+        Oversized boxes would fill too many tiles, they query the labels by themselves
         """
-        reciter = kdb.RecursiveShapeIterator(self.kdb_layout, self.kdb_cell, layer, box)
-        res = [s.shape() for s in reciter.each()]
-        if(len(res) == 0):
-            # LOGGER.error(f"No labels on the pin {box.to_s()}")
-            # raise CompilerLayoutError()
-            return None
-        elif(len(res) > 1):
-            LOGGER.error(f"More then 1 label on the pin {box.to_s()}")
-            raise LayoutError()
-        return res[0]
+        if not boxes:
+            return []
+        sizes = sorted(max(box.width(), box.height()) for box in boxes)
+        step = max(sizes[len(sizes)//2], 1) # Median box size
+        lefts = [box.left for box in boxes]
+        bottoms = [box.bottom for box in boxes]
+        rights = [box.right for box in boxes]
+        tops = [box.top for box in boxes]
+        # Tile -> boxes as linked lists in flat lists, keeps the garbage collector out of the loop
+        heads:Dict[int, int] = {} # Tile key -> first entry
+        entry_box:List[int] = []
+        entry_next:List[int] = []
+        oversized:List[int] = []
+        for ind in range(len(boxes)):
+            tiles = (rights[ind] // step - lefts[ind] // step + 1) * (tops[ind] // step - bottoms[ind] // step + 1)
+            if tiles > _MAX_LABEL_TILES:
+                oversized.append(ind)
+                continue
+            for grid_x in range(lefts[ind] // step, rights[ind] // step + 1):
+                for grid_y in range(bottoms[ind] // step, tops[ind] // step + 1):
+                    key = (grid_x << 32) + grid_y
+                    entry_next.append(heads.get(key, -1))
+                    heads[key] = len(entry_box)
+                    entry_box.append(ind)
+        res:List[Union[kdb.Text,None]] = [None] * len(boxes)
+        # Flat collection of all labels in the hierarchy, transformed into the cell
+        labels = kdb.Texts(kdb.RecursiveShapeIterator(self.kdb_layout, self.kdb_cell, layer))
+        for text in labels.each():
+            x, y = text.x, text.y
+            entry = heads.get(((x // step) << 32) + y // step, -1)
+            while entry >= 0:
+                ind = entry_box[entry]
+                entry = entry_next[entry]
+                if not (lefts[ind] <= x <= rights[ind] and bottoms[ind] <= y <= tops[ind]):
+                    continue
+                if res[ind] is not None:
+                    LOGGER.error(f"More then 1 label on the pin {boxes[ind].to_s()}")
+                    raise LayoutError()
+                res[ind] = text
+        for ind in oversized:
+            texts = list(labels.interacting(kdb.Region(boxes[ind])).each())
+            if len(texts) > 1:
+                LOGGER.error(f"More then 1 label on the pin {boxes[ind].to_s()}")
+                raise LayoutError()
+            res[ind] = texts[0] if texts else None
+        if LOGGER.isEnabledFor(logging.DEBUG):
+            for box, text in zip(boxes, res):
+                if text is None:
+                    LOGGER.debug(f"No labels on the pin {box.to_s()}")
+        return res
     
+    @stats.timed("pin_extraction")
     def _get_pins(self) -> Dict[str,LayPin]:
         """
         Collect all labeld pins in the cell
@@ -307,14 +447,13 @@ class KDBCell():
         for lay_info in config.PIN_LAY:
             box_layer = self.kdb_layout.find_layer(lay_info[0])
             lbl_layer = self.kdb_layout.find_layer(lay_info[1])
-            for box_shape in self.kdb_cell.each_shape(box_layer):
-                if(not isinstance(box_shape.box, kdb.Box)):
+            if box_layer is None or lbl_layer is None: # No such layers in the cell
+                continue
+            boxes = [box_shape.box for box_shape in self.kdb_cell.each_shape(box_layer, kdb.Shapes.SBoxes)]
+            for box, label in zip(boxes, self._find_labels(lbl_layer, boxes)):
+                if label is None:
                     continue
-                label_shape = self._find_label(lbl_layer, box_shape.box)
-                if label_shape is None:
-                    continue
-                pin = LayPin(box_shape.box, lay_info[0],
-                             label_shape.text, lay_info[1])
+                pin = LayPin(box, lay_info[0], label, lay_info[1])
                 pins[pin.name] = pin 
         return pins
     
@@ -324,13 +463,107 @@ class KDBCell():
     def __repr__(self):
         return f"CELL: {self} [{self.pins}]"
     
+    def place(self) -> List[PlacementConflict]:
+        """ Resolve deferred placement, loaded cells have nothing to place """
+        return []
+
+    def annotate(self):
+        """ Insert instance labels and pin shapes, loaded cells have them already """
+        return None
+    
+    @stats.timed("compact")
+    def compact(self, measure:bool = False) -> CompactReport:
+        """ Remove orphan and duplicate cells of the layout, see compactor.compact().
+            The shared layout is kept as it is, other builds refer to its cells
+        """
+        if self.kdb_layout is _SHARED_LAYOUT:
+            return CompactReport()
+        cells = self.__dict__.get("_cells") or {}
+        indices = {name: cell.kdb_cell.cell_index() for name, cell in cells.items()}
+        report = compact(self.kdb_layout, self.kdb_cell, measure=measure)
+        for name, index in indices.items(): # Subcells must refer to the remaining copies
+            if index in report.merged_indices:
+                cells[name].kdb_cell = self.kdb_layout.cell(report.merged_indices[index])
+        if report.cells_saved:
+            LOGGER.info(f"[{self.name}] {report}")
+        return report
+    
+    @stats.timed("layout_write")
     def save(self, filename:str, libname:str = "ic-stitcher"):
+        """ Save the cell and its subtree, the format is taken from the suffix of filename
+            (.gds, .gds.gz, .oas) or from GlobalLayoutConfigs.OUTPUT_FORMAT
+        """
+        self.place()
+        self.annotate()
+        if config.COMPACT_ON_SAVE:
+            self.compact()
         tech = self.kdb_layout.technology()
         opt = tech.save_layout_options
-        opt.gds2_write_timestamps = True
-        opt.gds2_libname = libname
+        output_format = layout_format(filename)
+        if output_format == "oas":
+            opt.format = "OASIS"
+            opt.oasis_compression_level = config.OASIS_COMPRESSION
+            opt.oasis_write_cblocks = config.OASIS_CBLOCKS
+            opt.oasis_strict_mode = config.OASIS_STRICT
+        else:
+            opt.format = "GDS2"
+            opt.gds2_write_timestamps = config.WRITE_TIMESTAMPS
+            opt.gds2_libname = libname
+        filename = str(filename)
+        if output_format == "gds.gz" and not filename.lower().endswith(".gz"):
+            filename += ".gz" # KLayout compresses files by the suffix
+        opt.select_cell(self.kdb_cell.cell_index()) # This cell and its subtree only
         self.kdb_layout.write(filename, options=opt)
 
+# Saved layout formats and their file suffixes
+LAYOUT_FORMATS:Dict[str, str] = {"gds": ".gds", "gds.gz": ".gds.gz", "oas": ".oas"}
+
+def layout_format(filename:Union[Path,str,None] = None) -> str:
+    """ Format of a layout file by its suffix, GlobalLayoutConfigs.OUTPUT_FORMAT if unknown """
+    if filename is not None:
+        lowered = str(filename).lower()
+        for output_format in sorted(LAYOUT_FORMATS, key=len, reverse=True): # ".gds.gz" first
+            if lowered.endswith(LAYOUT_FORMATS[output_format]):
+                return output_format
+    if config.OUTPUT_FORMAT not in LAYOUT_FORMATS:
+        raise LayoutError(f"Unknown OUTPUT_FORMAT '{config.OUTPUT_FORMAT}', expected one of {list(LAYOUT_FORMATS)}")
+    return config.OUTPUT_FORMAT
+
+def layout_suffix() -> str:
+    """ Suffix of saved layouts, see GlobalLayoutConfigs.OUTPUT_FORMAT """
+    return LAYOUT_FORMATS[layout_format()]
+
+# Layout of the current build, if GlobalLayoutConfigs.SHARED_LAYOUT is enabled
+_SHARED_LAYOUT:Union[kdb.Layout,None] = None
+# Leafcells, already copied into the shared layout
+_SHARED_LEAFCELLS:Dict[str, KDBCell] = {}
+
+def shared_layout() -> kdb.Layout:
+    """ Layout, shared by all cells of the current build """
+    global _SHARED_LAYOUT
+    if _SHARED_LAYOUT is None:
+        _SHARED_LAYOUT = kdb.Layout(True)
+    return _SHARED_LAYOUT
+
+def reset_shared_layout():
+    """ Start a new build, following cells are created in a new shared layout.
+        Cells of the previous build stay valid, until they are released
+    """
+    global _SHARED_LAYOUT
+    _SHARED_LAYOUT = None
+    _SHARED_LEAFCELLS.clear()
+
+def _shared_cell(cell:KDBCell) -> KDBCell:
+    """ Reference a cell in the shared layout, only leafcells have to be copied there (once) """
+    layout = shared_layout()
+    if cell.kdb_layout is layout:
+        return cell
+    if cell.name not in _SHARED_LEAFCELLS:
+        new_cell = layout.create_cell(cell.name)
+        new_cell.copy_tree(cell.kdb_cell)
+        _SHARED_LEAFCELLS[cell.name] = KDBCell(new_cell, cell.pins)
+    return _SHARED_LEAFCELLS[cell.name]
+
 class CustomLayoutCell(KDBCell):
     def __init__(self, name) -> None:
         """Create a cell represented by a KLayout cell object. 
@@ -343,24 +576,93 @@ class CustomLayoutCell(KDBCell):
         Raises:
             ERROR: _description_
         """
-        name = name
-        layout = kdb.Layout(True)
-        layout.create_cell(name)
-        super().__init__(layout.top_cell())
+        if config.SHARED_LAYOUT:
+            new_cell = shared_layout().create_cell(name)
+        else:
+            layout = kdb.Layout(True)
+            new_cell = layout.create_cell(name)
+        super().__init__(new_cell, pins={}) # Pins are added with add_pin()
+        self._cells = {}
+        self._instances = {}
+        self.placer = Placer() if config.DEFERRED_PLACEMENT else None
+        self.conflicts:List[PlacementConflict] = []
+        self._annotation:List[kdb.Shape] = [] # Shapes, inserted by annotate()
+        self._annotated = False
+
+    def pins_moved(self):
+        super().pins_moved()
+        self._annotated = False
     
-    def _add_cell(self, cell:"CustomLayoutCell"):
+    @stats.timed("place")
+    def place(self) -> List[PlacementConflict]:
+        """
+        Resolve the recorded placement constraints, moving each instance once.
+        Returns conflicts of this call, all of them are kept in self.conflicts
+        """
+        if self.placer is None:
+            return []
+        displacements, conflicts = self.placer.solve()
+        for instance, (dx, dy) in displacements:
+            instance.move(kdb.Vector(dx, dy))
+        for conflict in conflicts:
+            LOGGER.warning(f"[{self.name}] placement conflict {conflict}")
+        self.conflicts.extend(conflicts)
+        return conflicts
+
+    def annotate(self):
+        """
+        Insert instance labels and shapes of the top pins, once the instances are placed.
+        Shapes of a previous call are replaced, if the cell was modified since then
+        """
+        if self._annotated:
+            return None
+        with stats.phase("annotate"):
+            self._annotate()
+        self._annotated = True
+
+    def _annotate(self):
+        if self._annotation:
+            stats.count("reannotations")
+        for shape in self._annotation:
+            shape.delete()
+        boxes:Dict[int, List[kdb.Box]] = {}
+        texts:Dict[int, List[kdb.Text]] = {}
+        for pin in self.pins.values():
+            boxes.setdefault(self.kdb_layout.layer(pin.box_layer), []).append(pin.box)
+            texts.setdefault(self.kdb_layout.layer(pin.label_layer), []).append(pin.text)
+        if config.INSTANCE_LABEL_LAYER is not None:
+            cell_boxes:Dict[int, kdb.Box] = {}
+            labels = texts.setdefault(self.kdb_layout.layer(config.INSTANCE_LABEL_LAYER), [])
+            labels.extend(inst.label(cell_boxes) for inst in self.instances.values())
+        annotation = []
+        for layer_indx, layer_boxes in boxes.items():
+            shapes = self.kdb_cell.shapes(layer_indx)
+            annotation.extend(shapes.insert(box) for box in layer_boxes)
+        box_count = len(annotation)
+        for layer_indx, layer_texts in texts.items():
+            shapes = self.kdb_cell.shapes(layer_indx)
+            annotation.extend(shapes.insert(text) for text in layer_texts)
+        stats.count("shape_inserts", box_count)
+        stats.count("label_inserts", len(annotation) - box_count)
+        self._annotation = annotation
+    
+    def _add_cell(self, cell:KDBCell):
         """ 
         Adding a cell into the current cell tree
         """
         cell_name = cell.name    
+        cell.place() # Pins of a subcell must be at their final positions
+        cell.annotate()
         
         if(cell_name in self.cells.keys()):
             return self.cells[cell_name]
-        cell_to_add = cell.kdb_cell
-        new_cell = self.kdb_layout.create_cell(cell_name)
-        new_cell.copy_tree(cell_to_add)
-        #self.kdb_cell.copy_tree(new_cell)
-        custom_cell = KDBCell(new_cell)
+        with stats.phase("cell_copy"):
+            if config.SHARED_LAYOUT:
+                custom_cell = _shared_cell(cell)
+            else:
+                new_cell = self.kdb_layout.create_cell(cell_name)
+                new_cell.copy_tree(cell.kdb_cell)
+                custom_cell = KDBCell(new_cell, cell.pins)
         self.cells[cell_name] = custom_cell
         return custom_cell
     
@@ -373,37 +675,78 @@ class CustomLayoutCell(KDBCell):
         cell_inst_arr = kdb.CellInstArray(ref_cell.kdb_cell, trans)
         cell_inst = self.kdb_cell.insert(cell_inst_arr)
         custom_inst = CustomInstance(inst_name, cell, self, cell_inst)
-        custom_inst.add_label()
+        if self.placer is not None:
+            self.placer.add(custom_inst)
+        self.instances[inst_name] = custom_inst
+        self._annotated = False
+        return custom_inst
+
+    def insert_array(self, inst_name:str, cell:"CustomLayoutCell",
+                     na:int, nb:int, a:kdb.Vector, b:kdb.Vector,
+                     trans:kdb.Trans = R0) -> CustomArrayInstance:
+        """
+        Insert a regular array of na x nb instances with a/b step vectors as one instance
+        """
+        ref_cell = self._add_cell(cell)
+        cell_inst_arr = kdb.CellInstArray(ref_cell.kdb_cell.cell_index(), trans, a, b, na, nb)
+        cell_inst = self.kdb_cell.insert(cell_inst_arr)
+        custom_inst = CustomArrayInstance(inst_name, cell, self, cell_inst, na, nb, a, b)
+        if self.placer is not None:
+            self.placer.add(custom_inst)
         self.instances[inst_name] = custom_inst
+        self._annotated = False
         return custom_inst
 
     def add_pin(self, net:LayNet, pin_name:str):
-        inst_pin = net.ref_pin
-        new_pin = inst_pin.copy()
-        new_pin.text.string = pin_name
-        layer_indx = self.kdb_layout.layer(new_pin.box_layer)
-        box_shapes = self.kdb_cell.shapes(layer_indx)
-        layer_indx = self.kdb_layout.layer(new_pin.label_layer)
-        lbl_shapes = self.kdb_cell.shapes(layer_indx)
-        new_box_shape = box_shapes.insert(new_pin.box)
-        new_label_shape = lbl_shapes.insert(new_pin.text)
-        #lpin = PlacedPin(new_box_shape, new_label_shape)
-        lpin = PlacedPin(new_box_shape, new_label_shape, adjust_label=True)
+        """ Top pin of the net, its shapes are inserted by annotate() """
         if(net.top_pin):
-            raise LayoutError(f"Pin {lpin} is already regestered for net {net}")
+            raise LayoutError(f"Pin {pin_name} is already regestered for net {net}")
+        lpin = PlacedPin(pin_name, net.ref_pin)
         net.top_pin = lpin
         self.pins[net.name] = lpin
+        self.pins_moved()
         return lpin
     
-    def add_net(self, net_name, ref_pin: LayPin):
+    def add_net(self, net_name, ref_pin: LayPin, ref_instance:CustomInstance = None):
         if(net_name in self.nets):
             return self.nets[net_name]
-        lnet = LayNet(net_name, ref_pin)
+        lnet = LayNet(net_name, ref_pin, ref_instance)
         self.nets[net_name] = lnet
         return lnet
     
 class LayLeafCell(KDBCell):
-    def __init__(self, name):
-        layout = _load_leafcell(name)
-        super().__init__(layout.top_cell())
+    # Attributes, which require the leafcell geometry to be read
+    _GEOMETRY = ("kdb_layout", "kdb_cell")
+    def __init__(self, name, rows:Union[List[PinRow],None] = None, path:Union[Path,None] = None):
+        """ Leafcell from LEAFCELL_PATH (or from path), rows are already extracted pins (see preload()) """
+        self.name = name
+        self.path = path if path is not None else LEAFCELLS.layout(name)
+        if rows is None and self.path is not None:
+            rows = PIN_CACHE.load(self.path)
+        if rows is None:
+            self._load_geometry()
+            if self.path is not None:
+                PIN_CACHE.save(self.path, [pin.to_row() for pin in self.pins.values()])
+            return None
+        # Pins are taken from the cache, geometry is read on the first access (see __getattr__)
+        LOGGER.debug(f"loading pins of '{self.name}' without the geometry")
+        self._pins = {row[0]:LayPin.from_row(row) for row in rows}
+        self._pin_table = None
+        self._cells = None
+        self._instances = None
+        self.nets = {}
+        self.is_empty = False
+
+    def _load_geometry(self):
+        layout = _load_leafcell(self.name, self.path)
+        # A file can hold a library of cells, the one named after the leafcell is taken then
+        kdb_cell = layout.cell(self.name) or layout.top_cell()
+        super().__init__(kdb_cell, self.__dict__.get("_pins"))
         LOGGER.debug(f"loading cell '{self.name}' from leafcells")
+
+    def __getattr__(self, name:str):
+        # Called only for missing attributes, i.e. the geometry is not read yet
+        if name in LayLeafCell._GEOMETRY:
+            self._load_geometry()
+            return self.__dict__[name]
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
\ No newline at end of file
@@ -0,0 +1,102 @@
+"""
+Persistent cache of pins, extracted from layout leafcells.
+The pin table of a leafcell file is stored as JSON in GlobalLayoutConfigs.PIN_CACHE_DIR,
+keyed by the file content hash and the configurations affecting the extraction
+(PIN_LAY, INPUT_MAPPER, CREATE_OTHER_LAYERS, TECH_NAME).
+"""
+import os
+import json
+import hashlib
+import logging
+from pathlib import Path
+from typing import Dict, List, Tuple, Union
+
+from ..configurations import GlobalLayoutConfigs as config
+from ..configurations import GlobalConfigs as globconf
+
+LOGGER = logging.getLogger(__name__)
+
+# Version of the stored table format, change it to invalidate all caches
+CACHE_VERSION = 1
+
+# One row of a pin table: name, box, box layer, label transformation, label size, label layer
+PinRow = Tuple[str, str, Tuple[int,int,str], str, int, Tuple[int,int,str]]
+
+def file_hash(path:Union[Path,str], chunk_size:int = 1 << 20) -> str:
+    " SHA-256 of the file content "
+    sha = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+# Content hashes of files, by (path, modification time)
+_FILE_HASHES:Dict[Tuple[str,float], str] = {}
+
+def cached_file_hash(path:Union[Path,str]) -> str:
+    " SHA-256 of the file content, computed again only if the file was modified "
+    stamp = (str(path), os.stat(path).st_mtime)
+    if stamp not in _FILE_HASHES:
+        _FILE_HASHES[stamp] = file_hash(path)
+    return _FILE_HASHES[stamp]
+
+def config_key() -> str:
+    " Layout configurations, affecting the pin extraction "
+    pin_lay = ";".join(f"{box.to_s()},{lbl.to_s()}" for box, lbl in config.PIN_LAY)
+    return "|".join([pin_lay,
+                     config.INPUT_MAPPER.to_string(),
+                     str(config.CREATE_OTHER_LAYERS),
+                     globconf.TECH_NAME])
+
+class PinCache():
+    """ Directory of extracted pin tables, disabled when cache_dir is None """
+    def __init__(self, cache_dir:Union[Path,str,None] = None) -> None:
+        self.cache_dir = cache_dir
+
+    @property
+    def directory(self) -> Union[Path,None]:
+        cache_dir = self.cache_dir if self.cache_dir is not None else config.PIN_CACHE_DIR
+        if cache_dir is None:
+            return None
+        return Path(cache_dir)
+
+    def key(self, path:Union[Path,str]) -> str:
+        sha = hashlib.sha256()
+        sha.update(cached_file_hash(path).encode())
+        sha.update(config_key().encode())
+        sha.update(str(CACHE_VERSION).encode())
+        return sha.hexdigest()
+
+    def load(self, path:Union[Path,str]) -> Union[List[PinRow],None]:
+        " Get a pin table of a leafcell file, None if not cached "
+        directory = self.directory
+        if directory is None:
+            return None
+        cache_file = directory/f"{self.key(path)}.json"
+        if not cache_file.exists():
+            return None
+        try:
+            data = json.loads(cache_file.read_text())
+        except (OSError, ValueError) as exc:
+            LOGGER.warning(f"Ignoring broken pin cache '{cache_file}': {exc}")
+            return None
+        return [tuple(row) for row in data["pins"]]
+
+    def save(self, path:Union[Path,str], rows:List[PinRow]):
+        " Store a pin table of a leafcell file "
+        directory = self.directory
+        if directory is None:
+            return None
+        directory.mkdir(parents=True, exist_ok=True)
+        cache_file = directory/f"{self.key(path)}.json"
+        data = {
+            "version": CACHE_VERSION,
+            "source": str(path),
+            "pins": rows
+        }
+        # Write into a temporary file first, so parallel builds never read a partial table
+        tmp_file = cache_file.with_suffix(f".{os.getpid()}.tmp")
+        tmp_file.write_text(json.dumps(data))
+        os.replace(tmp_file, cache_file)
+
+PIN_CACHE = PinCache()
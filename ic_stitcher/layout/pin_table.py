@@ -0,0 +1,78 @@
+"""
+Columnar pin storage. A cell keeps its pins as one PinTable (boxes, layer ids, name index),
+instance terminals are the table and the instance transformation, LayPin objects
+are materialized only for the terminals, which are actually used.
+"""
+from typing import Dict, Iterator, List, Tuple
+from collections.abc import Mapping
+
+from ..configurations import Layer, kdb
+
+class PinTable():
+    """ Pins of a cell in columns, rows are in the order of the pins """
+    def __init__(self, pins:Dict[str, "LayPin"]) -> None:
+        self.names:List[str] = list(pins.keys())
+        self.index:Dict[str, int] = {name: ind for ind, name in enumerate(self.names)}
+        self.layers:List[Layer] = [] # Unique layers, referred by the layer ids
+        layer_ids:Dict[Tuple[int,int,str], int] = {}
+        def layer_id(layer:Layer) -> int:
+            key = (layer.layer, layer.datatype, layer.name)
+            if key not in layer_ids:
+                layer_ids[key] = len(self.layers)
+                self.layers.append(layer)
+            return layer_ids[key]
+        # Boxes and labels in the cell coordinates, never modified
+        self.boxes:List[kdb.Box] = []
+        self.texts:List[kdb.Text] = []
+        self.box_layers:List[int] = []
+        self.label_layers:List[int] = []
+        for pin in pins.values():
+            self.boxes.append(pin.box.dup())
+            self.texts.append(pin.text.dup())
+            self.box_layers.append(layer_id(pin.box_layer))
+            self.label_layers.append(layer_id(pin.label_layer))
+
+    def __len__(self):
+        return len(self.names)
+
+    def pin(self, name:str, trans:kdb.Trans, pin_class) -> "LayPin":
+        " Materialize one pin, transformed by trans "
+        ind = self.index[name]
+        return pin_class(self.boxes[ind].transformed(trans), self.layers[self.box_layers[ind]],
+                         self.texts[ind].transformed(trans), self.layers[self.label_layers[ind]])
+
+class TerminalMap(Mapping):
+    """ Terminals of an instance: the pin table of the cell and the instance transformation.
+        LayPin objects are created on the first access and follow the instance moves
+    """
+    def __init__(self, table:PinTable, trans:kdb.Trans, pin_class) -> None:
+        self.table = table
+        self.trans = trans
+        self._pin_class = pin_class
+        self._pins:Dict[str, "LayPin"] = {}
+
+    def __getitem__(self, name:str) -> "LayPin":
+        pin = self._pins.get(name)
+        if pin is None:
+            if name not in self.table.index:
+                raise KeyError(name)
+            pin = self.table.pin(name, self.trans, self._pin_class)
+            self._pins[name] = pin
+        return pin
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.table.names)
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    def __contains__(self, name) -> bool:
+        return name in self.table.index
+
+    def transform(self, trans:kdb.Trans):
+        self.trans = trans * self.trans
+        for pin in self._pins.values():
+            pin.transform(trans)
+
+    def __repr__(self):
+        return f"{self.table.names} ({self.trans})"
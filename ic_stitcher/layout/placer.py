@@ -0,0 +1,122 @@
+"""
+Deferred placement of instances, see GlobalLayoutConfigs.DEFERRED_PLACEMENT.
+Pin-to-pin constraints of all items are recorded first, then instances are grouped
+into rigid groups by a union-find with offsets and each instance is moved exactly once.
+"""
+from typing import Dict, List, Tuple, Any
+
+# Displacement in DBU
+Offset = Tuple[int, int]
+
+class PlacementConflict():
+    """ Constraint, which can't be satisfied by the already placed group """
+    def __init__(self, instance:str, terminal:str, net:str, mismatch:Offset) -> None:
+        self.instance = instance
+        self.terminal = terminal
+        self.net = net
+        self.mismatch = mismatch # Terminal position - expected position
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"instance": self.instance,
+                "terminal": self.terminal,
+                "net": self.net,
+                "mismatch": list(self.mismatch)}
+
+    def __str__(self):
+        return f"{self.instance}:{self.terminal} -> {self.net} is off by {self.mismatch}"
+
+    def __repr__(self):
+        return f"CONFLICT: {self}"
+
+class Placer():
+    """ Rigid groups of instances, connected by pins.
+        Node 0 is the fixed frame of the parent cell: instances placed by a previous
+        solve() and references without an instance are attached to it.
+    """
+    FIXED = 0
+    def __init__(self) -> None:
+        self._instances:List[Any] = [None] # Node -> instance, in insertion order
+        self._nodes:Dict[int, int] = {} # id(instance) -> node
+        self._parent:List[int] = [self.FIXED]
+        self._offset:List[Offset] = [(0, 0)] # Position of the node relative to its parent
+        self._size:List[int] = [1]
+        self.conflicts:List[PlacementConflict] = []
+
+    def add(self, instance) -> int:
+        " Register an inserted instance, which is free to move "
+        node = len(self._instances)
+        self._instances.append(instance)
+        self._nodes[id(instance)] = node
+        self._parent.append(node)
+        self._offset.append((0, 0))
+        self._size.append(1)
+        return node
+
+    def _node(self, instance) -> int:
+        if instance is None:
+            return self.FIXED
+        return self._nodes.get(id(instance), self.FIXED)
+
+    def _find(self, node:int) -> Tuple[int, Offset]:
+        " Root of the node and the node position relative to the root "
+        path = []
+        while self._parent[node] != node:
+            path.append(node)
+            node = self._parent[node]
+        root = node
+        # Path compression, from the closest to the root
+        x, y = 0, 0
+        for node in reversed(path):
+            dx, dy = self._offset[node]
+            x, y = x + dx, y + dy
+            self._parent[node] = root
+            self._offset[node] = (x, y)
+        if path:
+            return root, self._offset[path[0]]
+        return root, (0, 0)
+
+    def constrain(self, instance, terminal_name:str, terminal_pos:Offset,
+                  ref_instance, ref_pos:Offset, net_name:str = ""):
+        """ Terminal of the instance must be moved to the reference position,
+            positions are taken before any displacement
+        """
+        # p_inst + terminal_pos = p_ref + ref_pos
+        dx, dy = ref_pos[0] - terminal_pos[0], ref_pos[1] - terminal_pos[1]
+        node = self._node(instance)
+        ref_node = self._node(ref_instance)
+        root, (ox, oy) = self._find(node)
+        ref_root, (rx, ry) = self._find(ref_node)
+        if root == ref_root:
+            mismatch = (ox - rx - dx, oy - ry - dy)
+            if mismatch != (0, 0):
+                self.conflicts.append(PlacementConflict(str(instance), terminal_name, net_name, mismatch))
+            return None
+        # p_root + o = p_ref_root + r + d
+        shift = (rx + dx - ox, ry + dy - oy) # p_root relative to p_ref_root
+        if root == self.FIXED or (ref_root != self.FIXED and self._size[root] > self._size[ref_root]):
+            root, ref_root = ref_root, root
+            shift = (-shift[0], -shift[1])
+        self._parent[root] = ref_root
+        self._offset[root] = shift
+        self._size[ref_root] += self._size[root]
+
+    def solve(self) -> Tuple[List[Tuple[Any, Offset]], List[PlacementConflict]]:
+        """ Displacement of each instance, the earliest instance of a group stays in place
+            (or the fixed frame, if the group is attached to it). The placer is reset afterwards
+        """
+        anchors:Dict[int, Offset] = {}
+        positions:List[Tuple[int, Offset]] = []
+        for node in range(len(self._instances)):
+            root, pos = self._find(node)
+            positions.append((root, pos))
+            if root not in anchors: # Nodes are in insertion order, the first one is the earliest
+                anchors[root] = pos
+        res:List[Tuple[Any, Offset]] = []
+        for node, (root, (x, y)) in enumerate(positions):
+            if node == self.FIXED:
+                continue
+            ax, ay = anchors[root]
+            res.append((self._instances[node], (x - ax, y - ay)))
+        conflicts = self.conflicts
+        self.__init__()
+        return res, conflicts
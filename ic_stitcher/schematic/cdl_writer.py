@@ -0,0 +1,131 @@
+"""
+Streaming CDL output. A circuit is written as soon as its cell is finished (inserted into a parent
+or passed to write()), its subcircuits go first and each circuit is written once.
+Written circuits of custom cells can be released, keeping only the pins, which parents connect to.
+Each block is formatted by kdb.NetlistSpiceWriter (SAVE_USE_NET_NAMES, SAVE_WITH_COMMENTS),
+so the file equals KDBNetlistCell.save() except for the order of the circuits.
+"""
+import os
+import logging
+import tempfile
+from pathlib import Path
+from typing import List, Set, Union
+
+from ..configurations import GlobalSchematicConfigs as config
+from ..configurations import kdb
+from ..utils import stats
+from .netlister import KDBNetlistCell, LeafNetlistCell, NetlisterError, _STREAMS, _relink, is_leaf_circuit
+
+LOGGER = logging.getLogger(__name__)
+
+def _release(circuit:kdb.Circuit):
+    " Remove everything, but the pins and their nets "
+    for sub in list(circuit.each_subcircuit()):
+        circuit.remove_subcircuit(sub)
+    for device in list(circuit.each_device()):
+        circuit.remove_device(device)
+    circuit.purge_nets_keep_pins()
+
+class CDLWriter():
+    """Write circuits into a CDL file while the cells are built.
+
+    Args:
+        file: path of the CDL file
+        description: first comment line of the file
+        release: release the written circuits of custom cells, they can be instantiated
+            afterwards, but not saved or modified
+
+    Usage:
+        with CDLWriter("top.cdl") as cdl:
+            top = Top() # Subcells are written, once they're inserted
+            cdl.write(top.netlist)
+    """
+    def __init__(self, file:Union[Path,str], description:Union[str,None] = None, 
+                 release:bool = True) -> None:
+        self.path = Path(file)
+        self.release = release
+        self.written:Set[str] = set() # Names of the written circuits
+        self.circuits = 0
+        self._file = open(self.path, "w")
+        if description:
+            self._file.write(f"* {description}\n")
+        handle, tmp_name = tempfile.mkstemp(suffix=".cdl")
+        os.close(handle)
+        self._tmp_path = tmp_name # Blocks are formatted by KLayout through this file
+
+    def _block(self, circuit:kdb.Circuit) -> str:
+        " .SUBCKT block of the circuit, subcircuits refer to empty stubs "
+        netlist = kdb.Netlist()
+        netlist.case_sensitive = circuit.netlist().is_case_sensitive()
+        refs = {}
+        for sub in circuit.each_subcircuit():
+            ref = sub.circuit_ref()
+            if ref.name not in refs:
+                stub = kdb.Circuit()
+                stub.name = ref.name
+                for pin in ref.each_pin():
+                    stub.create_pin(pin.name())
+                netlist.add(stub)
+                refs[ref.name] = stub
+        copy = circuit._dup()
+        netlist.add(copy)
+        _relink(copy, refs)
+        writer = kdb.NetlistSpiceWriter()
+        writer.use_net_names = config.SAVE_USE_NET_NAMES
+        writer.with_comments = config.SAVE_WITH_COMMENTS
+        netlist.write(self._tmp_path, writer)
+        with open(self._tmp_path) as file:
+            text = file.read()
+        # The circuit is the only top one and goes first, stubs follow
+        end = text.find("\n.ENDS")
+        end = text.find("\n", end + 1)
+        return text[:end + 1] if end >= 0 else text
+
+    def _write_circuit(self, circuit:kdb.Circuit, released:List[kdb.Circuit]):
+        if circuit.name in self.written:
+            return None
+        self.written.add(circuit.name)
+        refs = {}
+        for sub in circuit.each_subcircuit():
+            refs.setdefault(sub.circuit_ref().name, sub.circuit_ref())
+        for ref in refs.values(): # Bottom-up
+            self._write_circuit(ref, released)
+        self._file.write(self._block(circuit))
+        self.circuits += 1
+        if not is_leaf_circuit(circuit): # Leafcells and their copies are shared, e.g. by SHARED_NETLIST
+            released.append(circuit)
+
+    @stats.timed("cdl_write")
+    def write(self, cell:KDBNetlistCell):
+        " Write the cell and the circuits it uses, which are not written yet "
+        if self._file is None:
+            raise NetlisterError(f"CDL stream '{self.path}' is closed")
+        released:List[kdb.Circuit] = []
+        self._write_circuit(cell.kdb_circuit, released)
+        self._file.flush()
+        if not self.release or isinstance(cell, LeafNetlistCell): # Leafcells are shared
+            return None
+        for circuit in released:
+            _release(circuit)
+        names = {circuit.name for circuit in released}
+        for released_cell in [cell, *cell.ref_cells.values()]:
+            released_cell.forget()
+            if released_cell.name in names:
+                released_cell.released = True
+
+    def close(self):
+        if self._file is None:
+            return None
+        self._file.close()
+        self._file = None
+        os.remove(self._tmp_path)
+        LOGGER.info(f"{self.circuits} circuits written into '{self.path}'")
+
+    def __enter__(self) -> "CDLWriter":
+        _STREAMS.append(self)
+        return self
+
+    def __exit__(self, *exc):
+        if self in _STREAMS:
+            _STREAMS.remove(self)
+        self.close()
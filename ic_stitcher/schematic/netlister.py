@@ -1,25 +1,28 @@
 #from __future__ import annotations
+import os
+import sys
+import threading
 from pathlib import Path
-from typing import List, Dict, Union
+from typing import List, Dict, Tuple, Union
 import logging
 
 from ..configurations import GlobalSchematicConfigs as config
-from ..configurations import _GET_LEAFCELL, kdb
-from ..utils.Logging import addStreamHandler
+from ..configurations import LEAFCELLS, kdb
+from ..utils.Logging import package_logger
+from ..utils import stats
 
 LOGGER = logging.getLogger(__name__)
-LOGGER.setLevel(logging.INFO)
-addStreamHandler(LOGGER, verbose=config.VERBOSE)
+package_logger() # The handler of all ic_stitcher loggers, see set_log_level()
 
 class NetlisterError(BaseException): ...
 
 class CustomNetlistReader(kdb.NetlistSpiceReaderDelegate):
+    def __init__(self) -> None:
+        super().__init__()
+        self.primitives = frozenset(config.NETLIST_PRIMITIVES)
 
     def wants_subcircuit(self, name: str) -> bool:
-        for primitive_device in config.NETLIST_PRIMITIVES:
-            if(name == primitive_device):
-                return True
-        return False
+        return name in self.primitives
     
     # def element(self, circuit: kdb.Circuit, 
     #             el: str, name: str, 
@@ -34,33 +37,116 @@ class CustomNetlistReader(kdb.NetlistSpiceReaderDelegate):
     #         cell.read_from_netlist()
     #     return super().element(circuit, el, name, model, value, nets, params)
 
-def _load_leafcell(cell_name:str) -> kdb.Netlist:
-    path_to_netlist = _GET_LEAFCELL(cell_name, config.LEAFCELL_PATH)
-    if(not path_to_netlist.exists()):
+# Circuit property of the leafcells and their copies (kept by _dup), they're shared by the cells
+LEAF_PROPERTY = "ic_stitcher.leafcell"
+
+def is_leaf_circuit(circuit:kdb.Circuit) -> bool:
+    return circuit.property(LEAF_PROPERTY) is not None
+
+class SpiceLibrary():
+    """ SPICE files, each one is parsed once. A library file can hold many subcircuits,
+        the leafcells of one file share its kdb.Netlist (they're copied into the parents)
+    """
+    def __init__(self) -> None:
+        # Resolved path -> modification time, primitives and the parsed netlist
+        self._netlists:Dict[Path, Tuple[float, frozenset, kdb.Netlist]] = {}
+        self.reads = 0
+        # A file is parsed by one thread, the others wait for its netlist (see preload())
+        self._locks:Dict[Path, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+
+    def _lock(self, path:Path) -> threading.Lock:
+        with self._locks_lock:
+            return self._locks.setdefault(path, threading.Lock())
+
+    def read(self, path:Union[Path,str]) -> kdb.Netlist:
+        path = Path(path).resolve()
+        with self._lock(path):
+            mtime = os.stat(path).st_mtime
+            primitives = frozenset(config.NETLIST_PRIMITIVES) # Primitives change the parsed circuits
+            cached = self._netlists.get(path)
+            if cached is not None and cached[0] == mtime and cached[1] == primitives:
+                return cached[2]
+            with stats.phase("netlist_read"):
+                netlist_reader = kdb.NetlistSpiceReader(CustomNetlistReader())
+                netlist = kdb.Netlist()
+                netlist.read(str(path), netlist_reader)
+                for circuit in netlist.each_circuit():
+                    circuit.set_property(LEAF_PROPERTY, True)
+            self.reads += 1
+            self._netlists[path] = (mtime, primitives, netlist)
+            return netlist
+
+    def clear(self):
+        self._netlists.clear()
+
+# Parsed SPICE files, shared by all leafcells
+SPICE_LIBRARY = SpiceLibrary()
+
+def _load_leafcell(cell_name:str, path:Union[Path,None] = None) -> kdb.Netlist:
+    path_to_netlist = path if path is not None else LEAFCELLS.netlist(cell_name)
+    if(path_to_netlist is None):
         raise NetlisterError(f"Failed to find leafcell for '{cell_name}'")
-    reader_deligate = CustomNetlistReader()
-    netlist_reader = kdb.NetlistSpiceReader(reader_deligate)
-    netlist = kdb.Netlist()
-    netlist.read(str(path_to_netlist.resolve()), netlist_reader)
-    return netlist
+    return SPICE_LIBRARY.read(path_to_netlist)
+
+def _copy_circuit(netlist:kdb.Netlist, circuit:kdb.Circuit) -> kdb.Circuit:
+    """ Copy a circuit and the circuits, it refers to, into netlist. Circuits already in netlist
+        (by name) are not copied again and subcircuits of the copies refer to the circuits of netlist
+    """
+    existing = netlist.circuit_by_name(circuit.name)
+    if existing is not None:
+        return existing
+    refs:Dict[str, kdb.Circuit] = {}
+    for sub in circuit.each_subcircuit():
+        ref = sub.circuit_ref()
+        if ref.name not in refs:
+            refs[ref.name] = _copy_circuit(netlist, ref)
+    copy = circuit._dup()
+    netlist.add(copy)
+    _relink(copy, refs)
+    return copy
+
+def _relink(circuit:kdb.Circuit, refs:Dict[str, kdb.Circuit]):
+    """ Make the subcircuits of a duplicated circuit refer to refs (by name), 
+        a duplicated subcircuit still refers to the circuit of the source netlist
+    """
+    for sub in list(circuit.each_subcircuit()):
+        ref = refs[sub.circuit_ref().name]
+        new_sub = circuit.create_subcircuit(ref, sub.name)
+        new_sub.trans = sub.trans
+        for pin in ref.each_pin():
+            net = sub.net_for_pin(pin.id())
+            if net is not None:
+                new_sub.connect_pin(pin, net)
+        circuit.remove_subcircuit(sub)
+
+def _intern(name:Union[str,None]) -> Union[str,None]:
+    " Names are repeated in many objects, one copy is kept "
+    return sys.intern(name) if name else name
+
+# Open streaming writers (see cdl_writer.CDLWriter), cells are written once they're inserted
+_STREAMS:List = []
 
 class NetlistPin():
+    __slots__ = ("kdb_pin", "name", "id")
     def __init__(self, kdb_pin:kdb.Pin) -> None:
         self.kdb_pin = kdb_pin
-        self.name = kdb_pin.name()
+        self.name = _intern(kdb_pin.name())
         self.id = kdb_pin.id()
     
     def copy(self):
         return NetlistPin(self.kdb_pin.dup())
 
 class NetlistNet():
+    __slots__ = ("kdb_net", "name", "pin", "id")
     def __init__(self, kdb_net:kdb.Net, pin:NetlistPin = None) -> None:
         self.kdb_net = kdb_net
-        self.name = kdb_net.name
+        self.name = _intern(kdb_net.name)
         self.pin = pin
         self.id = kdb_net.cluster_id
 
 class CustomNetlistInstance():
+    __slots__ = ("name", "kdb_subcircuit", "ref_cell", "parent")
     def __init__(self, kdb_subcircuit:kdb.SubCircuit, ref_cell:"KDBNetlistCell", parent:"KDBNetlistCell") -> None:
         self.name = kdb_subcircuit.name
         self.kdb_subcircuit = kdb_subcircuit
@@ -72,21 +158,68 @@ class CustomNetlistInstance():
         self.kdb_subcircuit.connect_pin(ref_pin.kdb_pin, net.kdb_net)
         
 class CustomDevice():
+    __slots__ = ("name", "kdb_device")
     def __init__(self, kdb_device:kdb.Device) -> None:
         self.name = kdb_device.name
         self.kdb_device = kdb_device
         
 class KDBNetlistCell():
+    """ Wrapper of a circuit. Pins, nets, instances and devices are indexed on the first access,
+        so a leaf netlist, which is only inserted, costs its pins and not its devices
+    """
     def __init__(self, kdb_netlist:kdb.Netlist, kdb_cell:kdb.Circuit):
         self.kdb_netlist = kdb_netlist
         self.kdb_circuit = kdb_cell
         self.name = kdb_cell.name
-        self.pins, self.orderd_pins = self._find_pins()
-        self.nets = self._find_nets()
-        self.instances = self._find_instances()
-        self.devices = self._find_devices()
-        self.ref_cells:Dict[str, KDBNetlistCell] = {}
-    
+        self.ref_cells:Dict[str, KDBNetlistCell] = {} # Filled by _fetch_cell()
+        self._pins:Union[Dict[str,NetlistPin],None] = None
+        self._ordered_pins:Union[List[NetlistPin],None] = None
+        self._nets:Union[Dict[str,NetlistNet],None] = None
+        self._instances:Union[Dict[str,CustomNetlistInstance],None] = None
+        self._devices:Union[Dict[str,CustomDevice],None] = None
+        self.released = False # Only the pins are left, see cdl_writer.CDLWriter
+
+    def _check_released(self):
+        if self.released:
+            raise NetlisterError(f"Cell '{self.name}' is released by a CDL stream, "
+                                 "it can only be instantiated")
+
+    @property
+    def pins(self) -> Dict[str,NetlistPin]:
+        if self._pins is None:
+            self._pins, self._ordered_pins = self._find_pins()
+        return self._pins
+
+    @property
+    def orderd_pins(self) -> List[NetlistPin]:
+        if self._ordered_pins is None:
+            self._pins, self._ordered_pins = self._find_pins()
+        return self._ordered_pins
+
+    @property
+    def nets(self) -> Dict[str,NetlistNet]:
+        if self._nets is None:
+            self._nets = self._find_nets()
+        return self._nets
+
+    @property
+    def instances(self) -> Dict[str,"CustomNetlistInstance"]:
+        if self._instances is None:
+            self._instances = self._find_instances()
+        return self._instances
+
+    @property
+    def devices(self) -> Dict[str,CustomDevice]:
+        if self._devices is None:
+            self._devices = self._find_devices()
+        return self._devices
+
+    def forget(self):
+        " Drop the indexed nets, instances and devices, after the circuit was modified outside "
+        self._nets = None
+        self._instances = None
+        self._devices = None
+
     def find_circuit(self, cell_name:str) -> kdb.Circuit:
         return self.kdb_netlist.circuit_by_name(cell_name)
     
@@ -100,7 +233,7 @@ class KDBNetlistCell():
             return cell
         leafcell = LeafNetlistCell(name)
         self.ref_cells[leafcell.name] = leafcell
-        return cell
+        return leafcell
     
     def _find_pins(self):
         res:Dict[str,NetlistPin] = {}
@@ -136,23 +269,70 @@ class KDBNetlistCell():
             res[device.name] = CustomDevice(device)
         return res   
     
+    @stats.timed("netlist_write")
     def save(self, file:str, description:str = None):
+        """ Save the circuit and its subtree, other circuits of a shared netlist are left out """
+        self._check_released()
+        netlist = self.kdb_netlist
+        tops = netlist.top_circuits()
+        if len(tops) != 1 or tops[0].name != self.name:
+            netlist = kdb.Netlist()
+            _copy_circuit(netlist, self.kdb_circuit)
         netlist_writer = kdb.NetlistSpiceWriter()
         netlist_writer.use_net_names = config.SAVE_USE_NET_NAMES
         netlist_writer.with_comments = config.SAVE_WITH_COMMENTS
-        self.kdb_netlist.write(file, netlist_writer, description=description)
+        netlist.write(file, netlist_writer, description=description)
             
+# Netlist of the current build, if GlobalSchematicConfigs.SHARED_NETLIST is enabled
+_SHARED_NETLIST:Union[kdb.Netlist,None] = None
+# Leafcells, already copied into the shared netlist
+_SHARED_LEAFCELLS:Dict[str, KDBNetlistCell] = {}
+
+def shared_netlist() -> kdb.Netlist:
+    """ Netlist, shared by all cells of the current build """
+    global _SHARED_NETLIST
+    if _SHARED_NETLIST is None:
+        _SHARED_NETLIST = kdb.Netlist()
+    return _SHARED_NETLIST
+
+def reset_shared_netlist():
+    """ Start a new build, following cells are created in a new shared netlist.
+        Cells of the previous build stay valid, until they are released
+    """
+    global _SHARED_NETLIST
+    _SHARED_NETLIST = None
+    _SHARED_LEAFCELLS.clear()
+
+def _shared_cell(cell:KDBNetlistCell) -> KDBNetlistCell:
+    """ Reference a cell in the shared netlist, only leafcells have to be copied there (once) """
+    netlist = shared_netlist()
+    if cell.kdb_netlist is netlist:
+        return cell
+    if cell.name not in _SHARED_LEAFCELLS:
+        _SHARED_LEAFCELLS[cell.name] = KDBNetlistCell(netlist, _copy_circuit(netlist, cell.kdb_circuit))
+    return _SHARED_LEAFCELLS[cell.name]
+
 class CustomNetlistCell(KDBNetlistCell):
     # loaded_cell:Dict[str,kdb.Circuit] = {}
     def __init__(self, name:str) -> None:
         # Create a new cell
-        kdb_netlist = kdb.Netlist()
         top_cell = kdb.Circuit()
-        top_cell.name = name
+        if config.SHARED_NETLIST:
+            kdb_netlist = shared_netlist()
+            # Circuit names must be unique, like the cell names of a shared layout ("name$1")
+            unique_name, ind = name, 0
+            while kdb_netlist.circuit_by_name(unique_name) is not None:
+                ind += 1
+                unique_name = f"{name}${ind}"
+            top_cell.name = unique_name
+        else:
+            kdb_netlist = kdb.Netlist()
+            top_cell.name = name
         kdb_netlist.add(top_cell)
         super().__init__(kdb_netlist, top_cell)
         
     def add_net(self, net_name:str):
+        self._check_released()
         if net_name in self.nets:
             return self.nets[net_name]
         kdb_net = self.kdb_circuit.create_net(net_name)
@@ -161,6 +341,7 @@ class CustomNetlistCell(KDBNetlistCell):
         return net
         
     def add_pin(self, net:NetlistNet, pin_name:str):
+        self._check_released()
         if pin_name in self.pins:
             return self.pins[pin_name]
             # raise NetlisterError(f"Trying to add existing pin '{pin_name}'")
@@ -169,20 +350,25 @@ class CustomNetlistCell(KDBNetlistCell):
         self.kdb_circuit.connect_pin(kdb_pin, net.kdb_net)
         self.pins[pin_name] = pin
         net.pin = pin
-        self.orderd_pins.append(pin)
+        if self._ordered_pins is not None:
+            self._ordered_pins.append(pin)
         return pin
        
     def add(self, cell:Union["CustomNetlistCell","LeafNetlistCell",KDBNetlistCell]) -> KDBNetlistCell:
         cellname = cell.name
         new_cell = self.ref_cells.get(cellname)
         if(not new_cell):
-            copy:kdb.Circuit = cell.kdb_circuit._dup()
-            self.kdb_netlist.add(copy)
-            new_cell = self._fetch_cell(cellname)
-            for ref_cell in cell.ref_cells.values():
-                self.ref_cells[ref_cell.name] = self.add(ref_cell)
-        else:
-            LOGGER.warning(f"[{self.name}] inserting an existing cell '{cellname}'")
+            for stream in _STREAMS: # The cell is finished, once it's used
+                stream.write(cell)
+            with stats.phase("netlist_copy"):
+                if config.SHARED_NETLIST:
+                    new_cell = _shared_cell(cell)
+                    self.ref_cells[cellname] = new_cell
+                else:
+                    _copy_circuit(self.kdb_netlist, cell.kdb_circuit)
+                    new_cell = self._fetch_cell(cellname)
+        else: # Another instance of the same cell
+            LOGGER.debug("[%s] inserting an existing cell '%s'", self.name, cellname)
         return new_cell
     
     def insert(self, inst_name:str, cell:Union["CustomNetlistCell","LeafNetlistCell"]) -> CustomNetlistInstance:
@@ -190,14 +376,17 @@ class CustomNetlistCell(KDBNetlistCell):
         Insert an instance by cell name and by pins, retriving a reference cell from loaded cells 
         or reading it from leafcells
         """
+        self._check_released()
         ref_cell = self.add(cell)
         sub = self.kdb_circuit.create_subcircuit(ref_cell.kdb_circuit, inst_name)
-        self.instances[inst_name] = sub
-        return CustomNetlistInstance(sub, ref_cell, self)
+        instance = CustomNetlistInstance(sub, ref_cell, self)
+        if self._instances is not None: # Otherwise it's found on the first access
+            self._instances[inst_name] = instance
+        return instance
 
 class LeafNetlistCell(KDBNetlistCell):
-    def __init__(self, name:str):
-        netlist = _load_leafcell(name)
+    def __init__(self, name:str, path:Union[Path,None] = None):
+        netlist = _load_leafcell(name, path)
         kdb_circuit = netlist.circuit_by_name(name)
         if not kdb_circuit:
             raise NetlisterError(f"Failed to find cell '{name}' in a leafcell")
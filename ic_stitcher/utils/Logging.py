@@ -1,38 +1,58 @@
-import logging
+import os
 import json
+import queue
+import atexit
 import getpass
+import logging
+import threading
 import logging.handlers
 from pathlib import Path
+from collections import deque
+from typing import List, Union
+
+# Messages of each category, kept in JSONLOG. The complete log is streamed by addJSONLogger()
+JSON_TAIL = 1000
+
+def _category(level:int) -> str:
+    if level >= logging.ERROR:
+        return "ERROR"
+    if level >= logging.WARNING:
+        return "WARNING"
+    return "INFO"
 
 class _JSONLogger():
-    """Log information in JSON format, categorized by errors, warnings, infos
+    """Log information in JSON format, categorized by errors, warnings, infos.
+       Only the last JSON_TAIL messages of each category are kept
     """
-    def __init__(self) -> None:
-        self.error = []
-        self.warning = []
-        self.info = []
+    def __init__(self, tail:int = JSON_TAIL) -> None:
+        self.error = deque(maxlen=tail)
+        self.warning = deque(maxlen=tail)
+        self.info = deque(maxlen=tail)
         self.user = getpass.getuser()
     
     def add(self, msg, level) -> None:
-        if(level == logging.ERROR or 
-           level == logging.CRITICAL):
+        category = _category(level)
+        if category == "ERROR":
             self.error.append(msg)
-        elif(level == logging.WARNING):
+        elif category == "WARNING":
             self.warning.append(msg)
         else:
             self.info.append(msg)
     
     def save(self, file:str):
+        _flush_json_handlers() # Records, which are still queued, are added first
         data = {
             'user': self.user,
-            'ERROR': self.error,
-            'WARNING': self.warning,
-            'INFO': self.info
+            'ERROR': list(self.error),
+            'WARNING': list(self.warning),
+            'INFO': list(self.info)
         }
         Path(file).write_text(json.dumps(data,indent=4))
 
 _default_format = "| %(asctime)s | %(levelname)s [%(name)s]: %(message)s "
 LOGGER = None
+# Loggers of the modules and the cells are children of it, they inherit its level and handler
+PACKAGE_LOGGER = "ic_stitcher"
 TIME_FORMAT = "%d-%m-%Y %H:%M:%S"
 # Global Logger for accumulation all log-info 
 JSONLOG = _JSONLogger()
@@ -67,9 +87,88 @@ class _JSONLogHandler(logging.Handler):
         formatted_json = self.formatter.format(record)
         JSONLOG.add(formatted_json, record.levelno)
 
+class _JSONLinesFormatter(logging.Formatter):
+    """ A record as one line of JSON with the user and the category of JSONLOG """
+    def format(self, record) -> str:
+        return json.dumps({"user": JSONLOG.user,
+                           "category": _category(record.levelno),
+                           "time": self.formatTime(record, TIME_FORMAT),
+                           "logger": record.name,
+                           "message": record.getMessage()})
+
+class _JSONQueueHandler(logging.handlers.QueueHandler):
+    """ Passes records to a background thread, which adds them to JSONLOG and writes them 
+        as JSON lines into a rotated file. The logging thread never waits for the file
+    """
+    def __init__(self, log_file:Union[str,None], max_bytes:float, file_count:int, mode:str,
+                 tail:bool = True) -> None:
+        super().__init__(queue.Queue()) # Unbounded, put() never blocks
+        self.log_file = log_file
+        self._pid = os.getpid()
+        self.sinks:List[logging.Handler] = []
+        if tail:
+            jsonh = _JSONLogHandler()
+            jsonh.setFormatter(logging.Formatter("%(asctime)s [%(name)s]: %(message)s", TIME_FORMAT))
+            self.sinks.append(jsonh)
+        if log_file is not None:
+            fh = logging.handlers.RotatingFileHandler(log_file, mode=mode, maxBytes=max_bytes,
+                                                      backupCount=file_count, encoding="utf-8")
+            fh.setFormatter(_JSONLinesFormatter())
+            self.sinks.append(fh)
+        self.listener = logging.handlers.QueueListener(self.queue, *self.sinks)
+        self.listener.start()
+        self._flush_lock = threading.Lock()
+        _JSON_HANDLERS.append(self)
+
+    def emit(self, record) -> None:
+        if os.getpid() != self._pid: # Forked worker, the thread is left in the parent process
+            return None
+        super().emit(record)
+
+    def flush(self):
+        " Wait until the records, queued so far, are written. The thread is stopped and restarted "
+        if self._pid != os.getpid() or self not in _JSON_HANDLERS:
+            return None
+        with self._flush_lock:
+            self.listener.stop() # Handles every record before its sentinel
+            self.listener.start()
+        for sink in self.sinks:
+            sink.flush()
+
+    def close(self):
+        " Write the queued records and stop the thread "
+        if self in _JSON_HANDLERS:
+            _JSON_HANDLERS.remove(self)
+            if self._pid == os.getpid():
+                with self._flush_lock:
+                    self.listener.stop()
+            for sink in self.sinks:
+                sink.close()
+        super().close()
+
+# Open JSON sinks, their queues are written before the logging shutdown at exit
+_JSON_HANDLERS:List[_JSONQueueHandler] = []
+
+def _flush_json_handlers():
+    for handler in list(_JSON_HANDLERS):
+        handler.flush()
+
+@atexit.register
+def _close_json_handlers():
+    for handler in list(_JSON_HANDLERS):
+        handler.close()
+
+class _StreamHandler(logging.StreamHandler):
+    """ Stream handler, added by addStreamHandler() """
+
 def addStreamHandler( logger: logging.Logger, verbose = False) -> None:
+    """ Add a colored stream handler to the logger, once. A repeated call only updates its level """
     #logger.setLevel(logging.INFO)
-    ch = logging.StreamHandler()
+    for handler in logger.handlers:
+        if isinstance(handler, _StreamHandler):
+            handler.setLevel(logging.DEBUG if verbose else logging.INFO)
+            return None
+    ch = _StreamHandler()
     if verbose:
         ch.setLevel(logging.DEBUG)
     else:
@@ -100,13 +199,53 @@ def addFHLogger( logger: logging.Logger,
     fh.setFormatter(formatter)
     logger.addHandler(fh)
     
-def addJSONLogger( logger: logging.Logger) -> None:
-    """ Add a JSON file handler to the existing _logger, so the logger additionaly writes a log into a _log_file. 
-        If _is_quite = True, it sets the logging level to ERROR, preventing unnecessary messages to be printed out.
+def addJSONLogger( logger: logging.Logger,
+                  log_file: Union[str,Path,None] = None,
+                  max_bytes = 1e7,
+                  file_count = 5,
+                  override: bool = False) -> None:
+    """ Add a JSON handler to the existing _logger. Messages are categorized in JSONLOG (its last JSON_TAIL
+        messages of each category) and, if log_file is given, streamed into it as JSON lines, 
+        rotated like addFHLogger(). Both are written by a background thread,
+        messages of forked processes (e.g. generate() workers) are not written.
     """
-    # JSON Handler
-    jsonh = _JSONLogHandler()
+    if log_file is not None:
+        log_file = str(Path(log_file).resolve())
+    handlers = [handler for handler in logger.handlers if isinstance(handler, _JSONQueueHandler)]
+    if any(handler.log_file == log_file for handler in handlers):
+        return None
+    # JSON Handler, only the first one of the logger fills JSONLOG
+    jsonh = _JSONQueueHandler(log_file, max_bytes, file_count, mode='w' if override else 'a',
+                              tail=not handlers)
     jsonh.setLevel(logging.DEBUG)
-    jsonh.setFormatter(logging.Formatter("%(asctime)s [%(name)s]: %(message)s", TIME_FORMAT))
     logger.addHandler(jsonh)
-    
\ No newline at end of file
+    
+def package_logger(name:str = "") -> logging.Logger:
+    """ Logger of a module or a cell under the package logger, e.g. package_logger("cell"). 
+        The package logger gets its stream handler on the first call, its children don't have handlers
+    """
+    logger = logging.getLogger(PACKAGE_LOGGER)
+    if not any(isinstance(handler, _StreamHandler) for handler in logger.handlers):
+        addStreamHandler(logger, verbose=True) # Filtered by the logger level
+        if logger.level == logging.NOTSET:
+            logger.setLevel(logging.INFO)
+    return logger.getChild(name) if name else logger
+
+class _CellLogger(logging.LoggerAdapter):
+    """ Messages of a cell, prefixed by its name. They're formatted only if the level is enabled """
+    def process(self, msg, kwargs):
+        return f"[{self.extra['cell']}] {msg}", kwargs
+
+def cell_logger(cell_name:str) -> logging.LoggerAdapter:
+    """ Logger of a cell, all cells share the "ic_stitcher.cell" logger and its handler """
+    return _CellLogger(package_logger("cell"), {"cell": cell_name})
+
+def set_log_level(level:int):
+    """ Level of all ic_stitcher messages, e.g. logging.DEBUG to see the connections of every item """
+    package_logger().setLevel(level)
+
+def quiet(enable:bool = True):
+    """ Production mode: only warnings and errors are logged, 
+        the per-item messages are not even formatted
+    """
+    set_log_level(logging.WARNING if enable else logging.INFO)
@@ -12,3 +12,11 @@ def remove_suffix(text:str, suffix:str) -> str: # python < 3.9 compatibility
             return text
         return text[:-len(suffix)]
     return text
+
+class nullcontext(): # python < 3.7 compatibility, contextlib.nullcontext
+    " Context manager, which does nothing "
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
@@ -0,0 +1,172 @@
+"""
+Build statistics, see GlobalConfigs.COLLECT_STATS.
+Phases of the build (leafcell reads, pin extraction, cell copies, instance moves, writers) are
+timed and counted into the BuildStats of the cell, which is being built: CustomCell.__setitem__,
+claim() and the leafcell loading collect into the stats of their cell. Times are inclusive,
+a phase called inside another one is also counted in the outer phase.
+When the statistics are disabled, an instrumented call costs one flag check.
+"""
+import os
+import json
+import time
+import functools
+import threading
+import contextlib
+from pathlib import Path
+from typing import Any, Dict, List, Tuple, Union
+
+from ..configurations import GlobalConfigs as globconf
+from .compatability import nullcontext
+
+class PhaseStats():
+    """ Calls and wall time of one phase, seconds """
+    __slots__ = ("calls", "time")
+    def __init__(self, calls:int = 0, time:float = 0.0) -> None:
+        self.calls = calls
+        self.time = time
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"calls": self.calls, "time": self.time}
+
+    def __repr__(self):
+        return f"PHASE: {self.calls} calls, {self.time:.6f}s"
+
+class BuildStats():
+    """ Phases, event counters and trace events of one cell """
+    def __init__(self, name:str = "") -> None:
+        self.name = name
+        self.phases:Dict[str, PhaseStats] = {}
+        self.counters:Dict[str, int] = {}
+        # Phase, start, duration (perf_counter seconds), thread id and cell, for the trace export
+        self.events:List[Tuple[str, float, float, int, str]] = []
+
+    def add(self, phase:str, start:float, end:float, trace:bool = True):
+        stats = self.phases.get(phase)
+        if stats is None:
+            stats = self.phases[phase] = PhaseStats()
+        stats.calls += 1
+        stats.time += end - start
+        if trace:
+            self.events.append((phase, start, end - start, threading.get_ident(), self.name))
+
+    def count(self, counter:str, value:int = 1):
+        self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def merge(self, other:"BuildStats"):
+        " Add the phases, counters and events of other "
+        for phase, stats in other.phases.items():
+            own = self.phases.get(phase)
+            if own is None:
+                own = self.phases[phase] = PhaseStats()
+            own.calls += stats.calls
+            own.time += stats.time
+        for counter, value in other.counters.items():
+            self.count(counter, value)
+        self.events.extend(other.events)
+
+    def collect(self):
+        " Context, in which the instrumented calls are recorded into these stats "
+        if not globconf.COLLECT_STATS:
+            return _NULL_CONTEXT
+        return _collecting(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"name": self.name,
+                "phases": {phase: stats.to_dict() for phase, stats in sorted(self.phases.items())},
+                "counters": dict(sorted(self.counters.items()))}
+
+    def to_chrome_trace(self) -> Dict[str, Any]:
+        """ Trace events (chrome://tracing, Perfetto): a complete event per traced phase call
+            and the final value of each counter
+        """
+        pid = os.getpid()
+        events = []
+        end = 0.0
+        for phase, start, duration, tid, cell in sorted(self.events, key=lambda event: event[1]):
+            events.append({"name": phase, "cat": "build", "ph": "X", "pid": pid, "tid": tid,
+                           "ts": start * 1e6, "dur": duration * 1e6, "args": {"cell": cell}})
+            end = max(end, start + duration)
+        for counter, value in sorted(self.counters.items()):
+            events.append({"name": counter, "ph": "C", "pid": pid, "ts": end * 1e6,
+                           "args": {counter: value}})
+        return {"traceEvents": events, "displayTimeUnit": "ms",
+                "otherData": {"cell": self.name}}
+
+    def save_json(self, file:Union[Path,str]):
+        Path(file).write_text(json.dumps(self.to_dict(), indent=1))
+
+    def save_trace(self, file:Union[Path,str]):
+        Path(file).write_text(json.dumps(self.to_chrome_trace()))
+
+    def __str__(self):
+        lines = [f"{self.name}:"]
+        for phase, stats in sorted(self.phases.items(), key=lambda item: -item[1].time):
+            lines.append(f"  {phase:<16} {stats.calls:>10} calls {stats.time:>12.6f}s")
+        for counter, value in sorted(self.counters.items()):
+            lines.append(f"  {counter:<16} {value:>10}")
+        return "\n".join(lines)
+
+    def __repr__(self):
+        return f"STATS: {self.name} {len(self.phases)} phases, {len(self.counters)} counters"
+
+_NULL_CONTEXT = nullcontext()
+_LOCAL = threading.local() # Stack of the collecting stats of each thread
+# Calls outside of any cell, e.g. preloading in other threads or direct KDBCell use
+UNATTRIBUTED = BuildStats("<unattributed>")
+
+@contextlib.contextmanager
+def _collecting(stats:BuildStats):
+    stack = _stack()
+    stack.append(stats)
+    try:
+        yield stats
+    finally:
+        stack.pop()
+
+def _stack() -> List[BuildStats]:
+    stack = getattr(_LOCAL, "stack", None)
+    if stack is None:
+        stack = _LOCAL.stack = []
+    return stack
+
+def current() -> BuildStats:
+    " Stats of the cell, which is being built in this thread "
+    stack = _stack()
+    return stack[-1] if stack else UNATTRIBUTED
+
+def count(counter:str, value:int = 1):
+    if globconf.COLLECT_STATS:
+        current().count(counter, value)
+
+@contextlib.contextmanager
+def _timing(phase:str, trace:bool):
+    stats = current()
+    start = time.perf_counter()
+    try:
+        yield stats
+    finally:
+        stats.add(phase, start, time.perf_counter(), trace)
+
+def phase(name:str, trace:bool = True):
+    " Context of one call of the phase "
+    if not globconf.COLLECT_STATS:
+        return _NULL_CONTEXT
+    return _timing(name, trace)
+
+def timed(name:str, trace:bool = True):
+    """ Decorator, which records every call of the function as the phase.
+        trace = False keeps frequent calls out of the trace events, they're only summed up
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not globconf.COLLECT_STATS:
+                return func(*args, **kwargs)
+            stats = current()
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                stats.add(name, start, time.perf_counter(), trace)
+        return wrapper
+    return decorator